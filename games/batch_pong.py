@@ -0,0 +1,241 @@
+"""Vectorized simulation of many games of Pong or Half Pong at once."""
+from pygame.locals import K_DOWN, K_UP
+import games.half_pong as half_pong
+import games.pong as pong
+import numpy as np
+
+
+class BatchPongEnv(object):
+    """Holds the state of N games in NumPy arrays and steps them all at once, with the
+    same rules as PongEnv (or HalfPongEnv) and a fixed time step.
+
+    Observations are rasterized straight into an N x 84 x 84 uint8 array equal to what
+    FramePreprocessor makes of the games' screens, so they can be stored and stacked
+    without further preprocessing. Like the screens, the first axis of each frame is x.
+    """
+
+    def __init__(self, num_games, half=False, dt=pong.frame_time, seed=None):
+        """Initializes the games.
+
+        Args:
+            num_games: The number of games to simulate.
+            half: If true, play Half Pong rather than Pong.
+            dt: The simulated seconds per frame.
+            seed (optional): Seed for the balls' random launch angles.
+        """
+        self.num_games = num_games
+        self.half = half
+        self.dt = dt
+        self.random = np.random.RandomState(seed)
+        self.game = half_pong if half else pong
+
+        # Offsets, from an object's corner, of the pixels each object lights.
+        width, height = int(self.game.screen_width), int(self.game.screen_height)
+        bar_x, bar_y = np.meshgrid(
+            np.arange(int(self.game.bar_width)), np.arange(int(self.game.bar_height)),
+            indexing='ij')
+        self.bar_offsets = bar_x.ravel(), bar_y.ravel()
+        self.ball_offsets = np.nonzero(
+            pong.circle_mask(self.game.circle_diameter, self.game.circle_radius))
+        self.pixels = np.zeros((num_games, width, height), dtype=np.uint8)
+
+        # Pong is twice as wide as it is tall, so pairs of columns are averaged.
+        self.downsample = 2 if not half else 1
+        self.gray_levels = np.round(
+            np.linspace(0, 255, self.downsample + 1)).astype(np.uint8)
+        self.lit = np.empty((num_games, width // self.downsample, height), dtype=np.uint8)
+        self.frames = np.empty_like(self.lit)
+        self.reset()
+
+    def reset(self):
+        """Starts new games, clearing the scores.
+
+        Returns:
+            The first frames.
+        """
+        n = self.num_games
+        game = self.game
+        if self.half:
+            self.bar1_x = np.full(n, game.bar_start_x)
+            self.circle_x = np.full(n, game.circle_start_x)
+            self.circle_y = np.full(n, game.circle_start_y)
+            self.speed_x = np.full(n, -game.screen_width / 1.28)
+            self.speed_y = np.full(n, game.screen_height / 1.92)
+        else:
+            self.bar1_x = np.full(n, game.bar1_start_x)
+            self.bar2_x = np.full(n, game.bar2_start_x)
+            self.bar2_y = np.full(n, game.bar_start_y)
+            self.circle_x = np.empty(n)
+            self.circle_y = np.empty(n)
+            self.speed_x = np.empty(n)
+            self.speed_y = np.empty(n)
+            self.__reset_balls(np.ones(n, dtype=np.bool_))
+        self.bar1_y = np.full(n, game.bar_start_y)
+        self.bar1_score = np.zeros(n, dtype=np.int64)
+        self.bar2_score = np.zeros(n, dtype=np.int64)
+        self.hit_count = np.zeros(n, dtype=np.int64)
+        self.miss_count = np.zeros(n, dtype=np.int64)
+        return self.render()
+
+    def __reset_balls(self, games):
+        """Serves the ball from the center towards the learner in the given Pong games.
+
+        Args:
+            games: Boolean mask of the games to serve in.
+        """
+        game = self.game
+        self.circle_x[games] = game.circle_start_x
+        self.circle_y[games] = game.circle_start_y
+        self.speed_x[games] = -game.screen_width / 1.28 / 2
+        self.speed_y[games] = self.random.uniform(
+            -game.screen_height/1.92, game.screen_height/1.92, size=np.count_nonzero(games))
+
+    def step(self, actions):
+        """Advances every game by one frame.
+
+        Args:
+            actions: Array of one action per game: K_UP or K_DOWN to move the learner's
+                bar, anything else to hold it.
+
+        Returns:
+            The new frames, the rewards and the terminal flags (in that order). See
+            PongEnv.step and HalfPongEnv.step. The frames are reused by the next call,
+            so copy them if they must outlive it.
+        """
+        actions = np.asarray(actions)
+        bar1_score, bar2_score = self.bar1_score.copy(), self.bar2_score.copy()
+        hit_count, miss_count = self.hit_count.copy(), self.miss_count.copy()
+        if self.half:
+            self.__simulate_half_pong(actions)
+            terminals = self.miss_count != miss_count
+            rewards = (self.hit_count - hit_count) - (self.miss_count - miss_count)
+        else:
+            self.__simulate_pong(actions)
+            rewards = (self.bar1_score - bar1_score) - (self.bar2_score - bar2_score)
+            terminals = rewards != 0
+        return self.render(), rewards.astype(np.float32), terminals
+
+    def __move(self, actions):
+        """Moves the learners' bars and the balls by one time step."""
+        ai_speed = self.game.speed_bar * self.dt
+        self.bar1_y += np.where(actions == K_UP, -ai_speed, np.where(actions == K_DOWN, ai_speed, 0.))
+        self.circle_x += self.speed_x * self.dt
+        self.circle_y += self.speed_y * self.dt
+
+    def __simulate_pong(self, actions):
+        """Applies the rules of games/pong.py to every game."""
+        g = self.game
+        self.__move(actions)
+
+        # AI of the computer.
+        chasing = (self.circle_x >= g.screen_width / 2) & \
+            (self.bar2_y != self.circle_y + g.circle_radius)
+        self.bar2_y += np.where(chasing, (self.circle_y - self.bar2_y) / 2, 0.)
+
+        # keep bars in bounds
+        for bar_y in (self.bar1_y, self.bar2_y):
+            np.clip(bar_y, g.bar_dist_from_edge, g.bar_max_y, out=bar_y)
+
+        # ball hits left bar
+        hits = (self.circle_x <= self.bar1_x + g.bar_width) & \
+            (self.circle_y >= self.bar1_y - g.circle_radius) & \
+            (self.circle_y <= self.bar1_y + g.circle_radius + g.bar_height)
+        self.circle_x[hits] = g.bar_dist_from_edge + g.bar_width
+        self.speed_x[hits] *= -1
+        self.hit_count += hits
+
+        # ball hits right bar
+        hits = (self.circle_x >= self.bar2_x - g.bar_width) & \
+            (self.circle_y >= self.bar2_y - g.circle_radius) & \
+            (self.circle_y <= self.bar2_y + g.circle_radius + g.bar_height)
+        self.circle_x[hits] = g.screen_width - g.bar_width
+        self.speed_x[hits] *= -1
+
+        # bar 1 loses, or bar 2 loses
+        lost1 = self.circle_x < -g.circle_radius
+        lost2 = ~lost1 & (self.circle_x > g.screen_width + g.circle_radius)
+        self.bar2_score += lost1
+        self.miss_count += lost1
+        self.bar1_score += lost2
+        self.__reset_balls(lost1 | lost2)
+
+        # ball hits bottom or top
+        self.__bounce(g.circle_radius, g.screen_height - g.circle_radius)
+
+    def __simulate_half_pong(self, actions):
+        """Applies the rules of games/half_pong.py to every game."""
+        g = self.game
+        self.__move(actions)
+
+        # keep bars in bounds
+        np.clip(self.bar1_y, g.bar_dist_from_edge, g.bar_max_y, out=self.bar1_y)
+
+        # ball hits left bar
+        hits = (self.circle_x < g.bar_dist_from_edge + g.bar_width) & \
+            (self.circle_y >= self.bar1_y - g.circle_radius) & \
+            (self.circle_y <= self.bar1_y + g.bar_height + g.circle_radius)
+        self.circle_x[hits] = g.bar_dist_from_edge + g.bar_width
+        self.speed_x[hits] *= -1
+        self.hit_count += hits
+
+        # ball hits left side, or right side
+        missed = self.circle_x < -g.circle_radius
+        bounced = ~missed & (self.circle_x > g.screen_width - g.circle_diameter)
+        self.miss_count += missed
+        self.circle_x[missed] = g.circle_start_x
+        self.circle_y[missed] = g.circle_start_y
+        self.bar1_y[missed] = g.bar_start_y
+        self.speed_x[bounced] *= -1
+
+        # ball hits top or bottom
+        self.__bounce(g.bar_dist_from_edge, g.screen_height - g.circle_diameter - g.circle_radius)
+
+    def __bounce(self, low, high):
+        """Bounces the balls off the top and bottom walls.
+
+        Args:
+            low: The lowest y coordinate the ball may reach.
+            high: The highest y coordinate the ball may reach.
+        """
+        low_hits = self.circle_y <= low
+        high_hits = ~low_hits & (self.circle_y >= high)
+        self.speed_y[low_hits | high_hits] *= -1
+        self.circle_y[low_hits] = low
+        self.circle_y[high_hits] = high
+
+    def render(self):
+        """Rasterizes the current frame of every game.
+
+        Returns:
+            The N x 84 x 84 uint8 array of preprocessed frames. The array is reused by
+            the next call, so copy it if it must outlive it.
+        """
+        # Only the few pixels covered by the bars and balls are written.
+        self.pixels.fill(0)
+        self.__draw(self.bar1_x, self.bar1_y, self.bar_offsets)
+        if not self.half:
+            self.__draw(self.bar2_x, self.bar2_y, self.bar_offsets)
+        self.__draw(self.circle_x, self.circle_y, self.ball_offsets)
+
+        # Area-average the columns, matching FramePreprocessor's rounding.
+        np.copyto(self.lit, self.pixels[:, ::self.downsample])
+        for column in range(1, self.downsample):
+            self.lit += self.pixels[:, column::self.downsample]
+        np.take(self.gray_levels, self.lit, out=self.frames)
+        return self.frames
+
+    def __draw(self, x, y, offsets):
+        """Lights the pixels of an object drawn at (x, y) in every game, clipped to the
+        screen.
+
+        Args:
+            x: Array of the objects' left edges, truncated to whole pixels.
+            y: Array of the objects' top edges, truncated to whole pixels.
+            offsets: Arrays of the x and y offsets of the object's pixels.
+        """
+        xs = x.astype(np.int64)[:, np.newaxis] + offsets[0]
+        ys = y.astype(np.int64)[:, np.newaxis] + offsets[1]
+        games = np.broadcast_to(np.arange(self.num_games)[:, np.newaxis], xs.shape)
+        width, height = self.pixels.shape[1:]
+        visible = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        self.pixels[games[visible], xs[visible], ys[visible]] = 1
@@ -1,11 +1,13 @@
 # Modified from http://www.pygame.org/project-Very+simple+Pong+game-816-.html
 import pygame
 from pygame.locals import *
+from games.pong import circle_mask, fill_rect, blit_mask
+import numpy as np
 
+# Scores of the game started by main(), updated every frame.
 miss_count = 0
 hit_count = 0
 
-pygame.init()
 screen_width = 84
 screen_height = 84
 
@@ -17,90 +19,170 @@ bar_start_x = bar_dist_from_edge
 bar_start_y = (screen_height - bar_height) / 2.
 bar_max_y = screen_height - bar_height - bar_dist_from_edge
 circle_start_x, circle_start_y = (screen_width - circle_diameter), (screen_width - circle_diameter) / 2.
-
-screen = pygame.display.set_mode((int(screen_width), int(screen_height)), 0, 32)
-
-# Creating a bar, a ball, and background.
-back = pygame.Surface((int(screen_width), int(screen_height)))
-background = back.convert()
-background.fill((0, 0, 0))
-bar = pygame.Surface((int(bar_width), int(bar_height)))
-bar = bar.convert()
-bar.fill((255, 255, 255))
-circle_surface = pygame.Surface((int(circle_diameter), int(circle_diameter)))
-pygame.draw.circle(circle_surface, (255, 255, 255), (int(circle_radius), int(circle_radius)), int(circle_radius))
-circle = circle_surface.convert()
-circle.set_colorkey((0, 0, 0))
-
-# some definitions
-bar_x = bar_start_x
-bar_y = bar_start_y
-circle_x, circle_y = circle_start_x, circle_start_y
-bar_move = 0.
-speed_x, speed_y, speed_bar = -screen_width / 1.28, screen_height / 1.92, screen_height * 1.2
-
-clock = pygame.time.Clock()
-font = pygame.font.SysFont("calibri",8)
-
-done = False
-while not done:
-    for event in pygame.event.get():  # User did something
-        if event.type == pygame.QUIT:  # If user clicked close
-            done = True  # Flag that we are done so we exit this loop
-        if event.type == KEYDOWN:
-            if event.key == K_UP:
-                bar_move = -ai_speed
-            elif event.key == K_DOWN:
-                bar_move = ai_speed
-        elif event.type == KEYUP:
-            if event.key == K_UP:
-                bar_move = 0.
-            elif event.key == K_DOWN:
-                bar_move = 0.
-
-    screen.blit(background, (0, 0))
-    screen.blit(bar, (bar_x, bar_y))
-    screen.blit(circle, (circle_x, circle_y))
-
-    bar_y += bar_move
-
-    # movement of circle
-    time_passed = clock.tick(30)
-    time_sec = time_passed / 1000.0
-
-    circle_x += speed_x * time_sec
-    circle_y += speed_y * time_sec
-    ai_speed = speed_bar * time_sec
-
-    # keep bars in bounds
-    if bar_y >= bar_max_y: bar_y = bar_max_y
-    elif bar_y <= bar_dist_from_edge: bar_y = bar_dist_from_edge
-
-    # ball hits left bar
-    if circle_x < bar_dist_from_edge + bar_width:
-        if circle_y >= bar_y - circle_radius and circle_y <= bar_y + bar_height + circle_radius:
-            circle_x = bar_dist_from_edge + bar_width
-            speed_x = -speed_x
-            hit_count += 1
-
-    # ball hits left side
-    if circle_x < -circle_radius:
-        miss_count += 1
-        circle_x, circle_y = circle_start_x, circle_start_y
-        bar_y = bar_start_y
-    # ball hits right side
-    elif circle_x > screen_width - circle_diameter:
-        speed_x = -speed_x
-
-    # ball hits top
-    if circle_y <= bar_dist_from_edge:
-        speed_y = -speed_y
-        circle_y = bar_dist_from_edge
-    # ball hits bottom
-    elif circle_y >= screen_height - circle_diameter - circle_radius:
-        speed_y = -speed_y
-        circle_y = screen_height - circle_diameter - circle_radius
-
-    pygame.display.update()
-
-pygame.quit()
+speed_bar = screen_height * 1.2
+
+# The simulated time between frames, matching the original 30 FPS clock.
+frame_time = 1 / 30.
+
+
+class HalfPongEnv(object):
+    """Pong against a wall, stepped one frame at a time with a fixed time step.
+
+    Frames are rasterized with NumPy in the same width x height x 3 layout as
+    pygame.surfarray, so no display is needed; one can optionally be opened to watch the
+    game.
+    """
+
+    def __init__(self, display=False, dt=frame_time):
+        """Initializes the game.
+
+        Args:
+            display: If true, open a window and draw every frame to it.
+            dt: The simulated seconds per frame.
+        """
+        self.display = display
+        self.dt = dt
+        self.ball_mask = circle_mask(circle_diameter, circle_radius)
+        self.pixels = np.zeros((screen_width, screen_height, 3), dtype=np.uint8)
+        if display:
+            self.__init_display()
+        self.reset()
+
+    def __init_display(self):
+        """Opens the window and creates the sprites drawn to it."""
+        pygame.init()
+        self.screen = pygame.display.set_mode((int(screen_width), int(screen_height)), 0, 32)
+
+        # Creating a bar, a ball, and background.
+        back = pygame.Surface((int(screen_width), int(screen_height)))
+        self.background = back.convert()
+        self.background.fill((0, 0, 0))
+        bar = pygame.Surface((int(bar_width), int(bar_height)))
+        self.bar = bar.convert()
+        self.bar.fill((255, 255, 255))
+        circle_surface = pygame.Surface((int(circle_diameter), int(circle_diameter)))
+        pygame.draw.circle(circle_surface, (255, 255, 255), (int(circle_radius), int(circle_radius)), int(circle_radius))
+        self.circle = circle_surface.convert()
+        self.circle.set_colorkey((0, 0, 0))
+
+    def reset(self):
+        """Starts a new game, clearing the scores.
+
+        Returns:
+            The first frame.
+        """
+        self.bar_x, self.bar_y = bar_start_x, bar_start_y
+        self.circle_x, self.circle_y = circle_start_x, circle_start_y
+        self.speed_x, self.speed_y = -screen_width / 1.28, screen_height / 1.92
+        self.hit_count, self.miss_count = 0, 0
+        return self.render()
+
+    def step(self, action, dt=None):
+        """Advances the game by one frame.
+
+        Args:
+            action: K_UP or K_DOWN to move the bar; anything else holds it.
+            dt (optional): The seconds to simulate, if not the fixed time step.
+
+        Returns:
+            The new frame, the reward (hits minus misses) and whether the ball was
+            missed (in that order).
+        """
+        hit_count, miss_count = self.hit_count, self.miss_count
+        self.simulate(action, dt)
+        if self.display:
+            self.draw()
+        missed = self.miss_count != miss_count
+        reward = (self.hit_count - hit_count) - (self.miss_count - miss_count)
+        return self.render(), float(reward), missed
+
+    def simulate(self, action, dt=None):
+        """Advances the game state by one frame without drawing it. See step."""
+        time_sec = self.dt if dt is None else dt
+        ai_speed = speed_bar * time_sec
+        if action == K_UP:
+            self.bar_y -= ai_speed
+        elif action == K_DOWN:
+            self.bar_y += ai_speed
+
+        # movement of circle
+        self.circle_x += self.speed_x * time_sec
+        self.circle_y += self.speed_y * time_sec
+
+        # keep bars in bounds
+        if self.bar_y >= bar_max_y: self.bar_y = bar_max_y
+        elif self.bar_y <= bar_dist_from_edge: self.bar_y = bar_dist_from_edge
+
+        # ball hits left bar
+        if self.circle_x < bar_dist_from_edge + bar_width:
+            if self.circle_y >= self.bar_y - circle_radius and self.circle_y <= self.bar_y + bar_height + circle_radius:
+                self.circle_x = bar_dist_from_edge + bar_width
+                self.speed_x = -self.speed_x
+                self.hit_count += 1
+
+        # ball hits left side
+        if self.circle_x < -circle_radius:
+            self.miss_count += 1
+            self.circle_x, self.circle_y = circle_start_x, circle_start_y
+            self.bar_y = bar_start_y
+        # ball hits right side
+        elif self.circle_x > screen_width - circle_diameter:
+            self.speed_x = -self.speed_x
+
+        # ball hits top
+        if self.circle_y <= bar_dist_from_edge:
+            self.speed_y = -self.speed_y
+            self.circle_y = bar_dist_from_edge
+        # ball hits bottom
+        elif self.circle_y >= screen_height - circle_diameter - circle_radius:
+            self.speed_y = -self.speed_y
+            self.circle_y = screen_height - circle_diameter - circle_radius
+
+    def render(self):
+        """Rasterizes the current frame.
+
+        Returns:
+            A screen_width x screen_height x 3 uint8 array. The array is reused by the
+            next call, so copy it if it must outlive it.
+        """
+        self.pixels.fill(0)
+        fill_rect(self.pixels, self.bar_x, self.bar_y, bar_width, bar_height)
+        blit_mask(self.pixels, self.ball_mask, self.circle_x, self.circle_y)
+        return self.pixels
+
+    def draw(self):
+        """Draws the current frame to the window."""
+        self.screen.blit(self.background, (0, 0))
+        self.screen.blit(self.bar, (self.bar_x, self.bar_y))
+        self.screen.blit(self.circle, (self.circle_x, self.circle_y))
+        pygame.display.update()
+
+
+def main():
+    """Plays the game in a window in real time, controlled with the arrow keys. The
+    module's score variables follow the game.
+    """
+    global miss_count, hit_count
+    env = HalfPongEnv(display=True)
+    clock = pygame.time.Clock()
+    action = K_UNKNOWN
+
+    done = False
+    while not done:
+        for event in pygame.event.get():  # User did something
+            if event.type == pygame.QUIT:  # If user clicked close
+                done = True  # Flag that we are done so we exit this loop
+            if event.type == KEYDOWN:
+                if event.key == K_UP:
+                    action = K_UP
+                elif event.key == K_DOWN:
+                    action = K_DOWN
+            elif event.type == KEYUP:
+                if event.key in (K_UP, K_DOWN):
+                    action = K_UNKNOWN
+
+        env.simulate(action, clock.tick(30) / 1000.0)
+        miss_count, hit_count = env.miss_count, env.hit_count
+        env.draw()
+
+    pygame.quit()
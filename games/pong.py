@@ -11,12 +11,13 @@
 import pygame
 from pygame.locals import *
 import random
-import pygame.surfarray as surfarray
+import numpy as np
 
+# Scores of the game started by main(), updated every frame.
 miss_count = 0
 hit_count = 0
+bar1_score, bar2_score = 0, 0
 
-pygame.init()
 screen_width = 168
 screen_height = 84
 
@@ -28,120 +29,236 @@ bar1_start_x, bar2_start_x = bar_dist_from_edge, screen_width - bar_dist_from_ed
 bar_start_y = (screen_height - bar_height) / 2.
 bar_max_y = screen_height - bar_height - bar_dist_from_edge
 circle_start_x, circle_start_y = (screen_width - circle_diameter) / 2, (screen_height - circle_diameter) / 2.
-
-screen = pygame.display.set_mode((int(screen_width), int(screen_height)), 0, 32)
-
-#Creating 2 bars, a ball and background.
-back = pygame.Surface((int(screen_width),int(screen_height)))
-background = back.convert()
-background.fill((0,0,0))
-bar = pygame.Surface((int(bar_width),int(bar_height)))
-bar1 = bar.convert()
-bar1.fill((255,255,255))
-bar2 = bar.convert()
-bar2.fill((255,255,255))
-circle_surface = pygame.Surface((int(circle_diameter),int(circle_diameter)))
-pygame.draw.circle(circle_surface,(255,255,255),(int(circle_radius),int(circle_radius)),int(circle_radius))
-circle = circle_surface.convert()
-circle.set_colorkey((0,0,0))
-
-# some definitions
-bar1_x, bar2_x = bar1_start_x , bar2_start_x
-bar1_y, bar2_y = bar_start_y, bar_start_y
-circle_x, circle_y = circle_start_x, circle_start_y
-bar1_move, bar2_move = 0. , 0.
 speed_bar = screen_height * 1.2
-bar1_score, bar2_score = 0,0
-speed_x = -screen_width / 1.28 / 2
-speed_y = random.uniform(-screen_height/1.92, screen_height/1.92)
-
-clock = pygame.time.Clock()
-font = pygame.font.SysFont("calibri",8)
-
-def reset():
-    global circle_x, circle_y, bar1_y, bar2_y, circle_start_x, circle_start_y, bar_start_y, screen_width, screen_height, speed_x, speed_y
-    circle_x, circle_y = circle_start_x, circle_start_y
-    speed_x = -screen_width / 1.28 / 2
-    speed_y = random.uniform(-screen_height/1.92, screen_height/1.92)
-
-reset()
-
-done = False
-while done==False:       
-    for event in pygame.event.get(): # User did something
-        if event.type == pygame.QUIT: # If user clicked close
-            done = True # Flag that we are done so we exit this loop
-        if event.type == KEYDOWN:
-            if event.key == K_UP or event.key == K_w:
-                bar1_move = -ai_speed
-            elif event.key == K_DOWN or event.key == K_s:
-                bar1_move = ai_speed
-        elif event.type == KEYUP:
-            if event.key == K_UP or event.key == K_w:
-                bar1_move = 0.
-            elif event.key == K_DOWN or event.key == K_s:
-                bar1_move = 0.
-            
-    screen.blit(background,(0,0))
-    screen.blit(bar1,(bar1_x,bar1_y))
-    screen.blit(bar2,(bar2_x,bar2_y))
-    screen.blit(circle,(circle_x,circle_y))
-
-    bar1_y += bar1_move
-        
-    # movement of circle
-    time_passed = clock.tick(30)
-    time_sec = time_passed / 1000.0
-        
-    circle_x += speed_x * time_sec
-    circle_y += speed_y * time_sec
-    ai_speed = speed_bar * time_sec
-    
-    # AI of the computer.
-    if circle_x >= screen_width / 2:
-        if not bar2_y == circle_y + circle_radius:
-            bar2_y += (circle_y - bar2_y) / 2
-
-    # keep bars in bounds
-    if bar1_y >= bar_max_y: bar1_y = bar_max_y
-    elif bar1_y <= bar_dist_from_edge: bar1_y = bar_dist_from_edge
-    if bar2_y >= bar_max_y: bar2_y = bar_max_y
-    elif bar2_y <= bar_dist_from_edge: bar2_y = bar_dist_from_edge
-
-    # ball hits left bar
-    if circle_x <= bar1_x + bar_width:
-        if circle_y >= (bar1_y - circle_radius) and circle_y <= (bar1_y + circle_radius + bar_height):
-            circle_x = bar_dist_from_edge + bar_width
-            speed_x = -speed_x
-            hit_count += 1
-                
-    # ball hits right bar
-    if circle_x >= bar2_x - bar_width:
-        if circle_y >= (bar2_y - circle_radius) and circle_y <= (bar2_y + circle_radius + bar_height):
-            circle_x = screen_width - bar_width
-            speed_x = -speed_x
-
-
-    # bar 1 loses
-    if circle_x < -circle_radius:
-        bar2_score += 1
-        miss_count += 1
-        reset()
-    # bar 2 loses
-    elif circle_x > screen_width + circle_radius:
-        bar1_score += 1
-        reset()
-
-    # ball hits bottom
-    if circle_y <= circle_radius:
-        speed_y = -speed_y
-        circle_y = circle_radius
-    # ball hits top
-    elif circle_y >= screen_height - circle_radius:
-        speed_y = -speed_y
-        circle_y = screen_height - circle_radius
-
-    pygame.display.update()
-            
-pygame.quit()
 
+# The simulated time between frames, matching the original 30 FPS clock.
+frame_time = 1 / 30.
+
+
+def circle_mask(diameter, radius):
+    """Returns the boolean mask of the pixels covered by the ball sprite.
+
+    Args:
+        diameter: The width and height of the sprite.
+        radius: The radius of the disc drawn in it.
+    """
+    offsets = np.arange(int(diameter)) - int(radius)
+    return offsets[:, np.newaxis] ** 2 + offsets[np.newaxis, :] ** 2 <= int(radius) ** 2
+
+
+def fill_rect(pixels, x, y, width, height):
+    """Fills a rectangle of a width x height (x channels) pixel array with white, like
+    blitting a white surface at (x, y).
+
+    Args:
+        pixels: The pixel array.
+        x, y: The top left corner, truncated to whole pixels.
+        width, height: The size of the rectangle, truncated to whole pixels.
+    """
+    x, y = int(x), int(y)
+    pixels[max(x, 0):max(x + int(width), 0), max(y, 0):max(y + int(height), 0)] = 255
+
+
+def blit_mask(pixels, mask, x, y):
+    """Sets the masked pixels of a sprite drawn at (x, y) to white, clipped to the
+    pixel array.
+
+    Args:
+        pixels: The width x height (x channels) pixel array.
+        mask: The width x height boolean mask of the sprite.
+        x, y: The top left corner, truncated to whole pixels.
+    """
+    x, y = int(x), int(y)
+    width, height = pixels.shape[:2]
+    left, top = max(-x, 0), max(-y, 0)
+    right, bottom = min(width - x, mask.shape[0]), min(height - y, mask.shape[1])
+    if left < right and top < bottom:
+        pixels[x + left:x + right, y + top:y + bottom][mask[left:right, top:bottom]] = 255
+
+
+class PongEnv(object):
+    """Pong against the computer, stepped one frame at a time with a fixed time step.
+
+    The learner controls the left bar. Frames are rasterized with NumPy in the same
+    width x height x 3 layout as pygame.surfarray, so no display is needed; one can
+    optionally be opened to watch the game.
+    """
+
+    def __init__(self, display=False, dt=frame_time, seed=None):
+        """Initializes the game.
+
+        Args:
+            display: If true, open a window and draw every frame to it.
+            dt: The simulated seconds per frame.
+            seed (optional): Seed for the ball's random launch angles.
+        """
+        self.display = display
+        self.dt = dt
+        self.random = random.Random(seed)
+        self.ball_mask = circle_mask(circle_diameter, circle_radius)
+        self.pixels = np.zeros((screen_width, screen_height, 3), dtype=np.uint8)
+        if display:
+            self.__init_display()
+        self.reset()
+
+    def __init_display(self):
+        """Opens the window and creates the sprites drawn to it."""
+        pygame.init()
+        self.screen = pygame.display.set_mode((int(screen_width), int(screen_height)), 0, 32)
+
+        #Creating 2 bars, a ball and background.
+        back = pygame.Surface((int(screen_width),int(screen_height)))
+        self.background = back.convert()
+        self.background.fill((0,0,0))
+        bar = pygame.Surface((int(bar_width),int(bar_height)))
+        self.bar = bar.convert()
+        self.bar.fill((255,255,255))
+        circle_surface = pygame.Surface((int(circle_diameter),int(circle_diameter)))
+        pygame.draw.circle(circle_surface,(255,255,255),(int(circle_radius),int(circle_radius)),int(circle_radius))
+        self.circle = circle_surface.convert()
+        self.circle.set_colorkey((0,0,0))
+
+    def reset(self):
+        """Starts a new game, clearing the scores.
+
+        Returns:
+            The first frame.
+        """
+        self.bar1_x, self.bar2_x = bar1_start_x, bar2_start_x
+        self.bar1_y, self.bar2_y = bar_start_y, bar_start_y
+        self.bar1_score, self.bar2_score = 0, 0
+        self.hit_count, self.miss_count = 0, 0
+        self.reset_ball()
+        return self.render()
+
+    def reset_ball(self):
+        """Serves the ball from the center towards the learner."""
+        self.circle_x, self.circle_y = circle_start_x, circle_start_y
+        self.speed_x = -screen_width / 1.28 / 2
+        self.speed_y = self.random.uniform(-screen_height/1.92, screen_height/1.92)
+
+    def step(self, action, dt=None):
+        """Advances the game by one frame.
+
+        Args:
+            action: K_UP or K_DOWN to move the learner's bar; anything else holds it.
+            dt (optional): The seconds to simulate, if not the fixed time step.
+
+        Returns:
+            The new frame, the reward (the change in the learner's score minus the change
+            in the computer's) and whether a point ended (in that order).
+        """
+        bar1_score, bar2_score = self.bar1_score, self.bar2_score
+        self.simulate(action, dt)
+        if self.display:
+            self.draw()
+        reward = (self.bar1_score - bar1_score) - (self.bar2_score - bar2_score)
+        return self.render(), float(reward), reward != 0
+
+    def simulate(self, action, dt=None):
+        """Advances the game state by one frame without drawing it. See step."""
+        time_sec = self.dt if dt is None else dt
+        ai_speed = speed_bar * time_sec
+        if action == K_UP:
+            self.bar1_y -= ai_speed
+        elif action == K_DOWN:
+            self.bar1_y += ai_speed
+
+        # movement of circle
+        self.circle_x += self.speed_x * time_sec
+        self.circle_y += self.speed_y * time_sec
+
+        # AI of the computer.
+        if self.circle_x >= screen_width / 2:
+            if not self.bar2_y == self.circle_y + circle_radius:
+                self.bar2_y += (self.circle_y - self.bar2_y) / 2
+
+        # keep bars in bounds
+        if self.bar1_y >= bar_max_y: self.bar1_y = bar_max_y
+        elif self.bar1_y <= bar_dist_from_edge: self.bar1_y = bar_dist_from_edge
+        if self.bar2_y >= bar_max_y: self.bar2_y = bar_max_y
+        elif self.bar2_y <= bar_dist_from_edge: self.bar2_y = bar_dist_from_edge
+
+        # ball hits left bar
+        if self.circle_x <= self.bar1_x + bar_width:
+            if self.circle_y >= (self.bar1_y - circle_radius) and self.circle_y <= (self.bar1_y + circle_radius + bar_height):
+                self.circle_x = bar_dist_from_edge + bar_width
+                self.speed_x = -self.speed_x
+                self.hit_count += 1
+
+        # ball hits right bar
+        if self.circle_x >= self.bar2_x - bar_width:
+            if self.circle_y >= (self.bar2_y - circle_radius) and self.circle_y <= (self.bar2_y + circle_radius + bar_height):
+                self.circle_x = screen_width - bar_width
+                self.speed_x = -self.speed_x
+
+        # bar 1 loses
+        if self.circle_x < -circle_radius:
+            self.bar2_score += 1
+            self.miss_count += 1
+            self.reset_ball()
+        # bar 2 loses
+        elif self.circle_x > screen_width + circle_radius:
+            self.bar1_score += 1
+            self.reset_ball()
+
+        # ball hits bottom
+        if self.circle_y <= circle_radius:
+            self.speed_y = -self.speed_y
+            self.circle_y = circle_radius
+        # ball hits top
+        elif self.circle_y >= screen_height - circle_radius:
+            self.speed_y = -self.speed_y
+            self.circle_y = screen_height - circle_radius
+
+    def render(self):
+        """Rasterizes the current frame.
+
+        Returns:
+            A screen_width x screen_height x 3 uint8 array. The array is reused by the
+            next call, so copy it if it must outlive it.
+        """
+        self.pixels.fill(0)
+        fill_rect(self.pixels, self.bar1_x, self.bar1_y, bar_width, bar_height)
+        fill_rect(self.pixels, self.bar2_x, self.bar2_y, bar_width, bar_height)
+        blit_mask(self.pixels, self.ball_mask, self.circle_x, self.circle_y)
+        return self.pixels
+
+    def draw(self):
+        """Draws the current frame to the window."""
+        self.screen.blit(self.background,(0,0))
+        self.screen.blit(self.bar,(self.bar1_x,self.bar1_y))
+        self.screen.blit(self.bar,(self.bar2_x,self.bar2_y))
+        self.screen.blit(self.circle,(self.circle_x,self.circle_y))
+        pygame.display.update()
+
+
+def main():
+    """Plays the game in a window in real time, controlled with the arrow keys (or W and
+    S). The module's score variables follow the game.
+    """
+    global miss_count, hit_count, bar1_score, bar2_score
+    env = PongEnv(display=True)
+    clock = pygame.time.Clock()
+    action = K_UNKNOWN
+
+    done = False
+    while done==False:
+        for event in pygame.event.get(): # User did something
+            if event.type == pygame.QUIT: # If user clicked close
+                done = True # Flag that we are done so we exit this loop
+            if event.type == KEYDOWN:
+                if event.key == K_UP or event.key == K_w:
+                    action = K_UP
+                elif event.key == K_DOWN or event.key == K_s:
+                    action = K_DOWN
+            elif event.type == KEYUP:
+                if event.key in (K_UP, K_w, K_DOWN, K_s):
+                    action = K_UNKNOWN
+
+        env.simulate(action, clock.tick(30) / 1000.0)
+        miss_count, hit_count = env.miss_count, env.hit_count
+        bar1_score, bar2_score = env.bar1_score, env.bar2_score
+        env.draw()
+
+    pygame.quit()
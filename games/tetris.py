@@ -5,6 +5,7 @@
 
 import random, time, pygame, sys
 from pygame.locals import *
+import numpy as np
 
 FPS = 25
 WINDOWWIDTH = 640
@@ -157,15 +158,32 @@ PIECES = {'S': S_SHAPE_TEMPLATE,
           'O': O_SHAPE_TEMPLATE,
           'T': T_SHAPE_TEMPLATE}
 
+# The board is stored as one integer bitmask per row, where bit WALLWIDTH + x is set
+# if column x is filled. The bits on either side of the board are always set, so a
+# piece hitting a wall and a piece hitting a box are the same AND.
+WALLWIDTH = TEMPLATEWIDTH - 1
+BOARDBITS = ((1 << BOARDWIDTH) - 1) << WALLWIDTH
+FULLROW = (1 << (BOARDWIDTH + 2 * WALLWIDTH)) - 1
+EMPTYROW = FULLROW & ~BOARDBITS
+
+
+def getPieceMasks(template):
+    # Return the (template row, row bitmask) pairs of a rotation's non-blank rows.
+    masks = []
+    for y in range(TEMPLATEHEIGHT):
+        mask = 0
+        for x in range(TEMPLATEWIDTH):
+            if template[y][x] != BLANK:
+                mask |= 1 << x
+        if mask:
+            masks.append((y, mask))
+    return masks
+
+PIECEMASKS = {shape: [getPieceMasks(template) for template in PIECES[shape]] for shape in PIECES}
+
 
 def main():
-    global FPSCLOCK, DISPLAYSURF, BASICFONT, BIGFONT
-    pygame.init()
-    FPSCLOCK = pygame.time.Clock()
-    DISPLAYSURF = pygame.display.set_mode((WINDOWWIDTH, WINDOWHEIGHT))
-    BASICFONT = pygame.font.Font('freesansbold.ttf', 18)
-    BIGFONT = pygame.font.Font('freesansbold.ttf', 100)
-    #  pygame.display.set_caption('Tetromino')
+    initDisplay()
 
     # showTextScreen('Tetromino')
     while True: # game loop
@@ -180,128 +198,338 @@ def main():
         showTextScreen('Game Over')
 
 
+def initDisplay():
+    global FPSCLOCK, DISPLAYSURF, BASICFONT, BIGFONT
+    pygame.init()
+    FPSCLOCK = pygame.time.Clock()
+    DISPLAYSURF = pygame.display.set_mode((WINDOWWIDTH, WINDOWHEIGHT))
+    BASICFONT = pygame.font.Font('freesansbold.ttf', 18)
+    BIGFONT = pygame.font.Font('freesansbold.ttf', 100)
+    #  pygame.display.set_caption('Tetromino')
+
+
 def runGame():
     # setup variables for the start of the game
     global board
-    board = getBlankBoard()
-    lastMoveDownTime = time.time()
-    lastMoveSidewaysTime = time.time()
-    lastFallTime = time.time()
-    movingDown = False # note: there is no movingUp variable
-    movingLeft = False
-    movingRight = False
-    score = 0
-    level, fallFreq = calculateLevelAndFallFreq(score)
-
-    fallingPiece = getNewPiece()
-    nextPiece = getNewPiece()
+    game = TetrisEnv(rng=random)
+    board = game.board
 
     while True: # game loop
-        if fallingPiece == None:
-            # No falling piece in play, so start a new piece at the top
-            fallingPiece = nextPiece
-            nextPiece = getNewPiece()
-            lastFallTime = time.time() # reset lastFallTime
-
-            if not isValidPosition(board, fallingPiece):
-                return # can't fit a new piece on the board, so game over
+        if not game.startPiece():
+            return # can't fit a new piece on the board, so game over
 
         checkForQuit()
         for event in pygame.event.get(): # event handling loop
             if event.type == KEYUP:
                 if (event.key == K_p):
-                    # Pausing the game
+                    # Pausing the game. The game clock only runs while ticking.
                     DISPLAYSURF.fill(BGCOLOR)
                     pygame.mixer.music.stop()
                     showTextScreen('Paused') # pause until a key press
                     pygame.mixer.music.play(-1, 0.0)
-                    lastFallTime = time.time()
-                    lastMoveDownTime = time.time()
-                    lastMoveSidewaysTime = time.time()
-                elif (event.key == K_LEFT or event.key == K_a):
-                    movingLeft = False
-                elif (event.key == K_RIGHT or event.key == K_d):
-                    movingRight = False
-                elif (event.key == K_DOWN or event.key == K_s):
-                    movingDown = False
+                    game.redrawAll = True
+                else:
+                    game.releaseKey(event.key)
 
             elif event.type == KEYDOWN:
-                # moving the piece sideways
-                if (event.key == K_LEFT or event.key == K_a) and isValidPosition(board, fallingPiece, adjX=-1):
-                    fallingPiece['x'] -= 1
-                    movingLeft = True
-                    movingRight = False
-                    lastMoveSidewaysTime = time.time()
-
-                elif (event.key == K_RIGHT or event.key == K_d) and isValidPosition(board, fallingPiece, adjX=1):
-                    fallingPiece['x'] += 1
-                    movingRight = True
-                    movingLeft = False
-                    lastMoveSidewaysTime = time.time()
-
-                # rotating the piece (if there is room to rotate)
-                elif (event.key == K_UP or event.key == K_w):
-                    fallingPiece['rotation'] = (fallingPiece['rotation'] + 1) % len(PIECES[fallingPiece['shape']])
-                    if not isValidPosition(board, fallingPiece):
-                        fallingPiece['rotation'] = (fallingPiece['rotation'] - 1) % len(PIECES[fallingPiece['shape']])
-                elif (event.key == K_q): # rotate the other direction
-                    fallingPiece['rotation'] = (fallingPiece['rotation'] - 1) % len(PIECES[fallingPiece['shape']])
-                    if not isValidPosition(board, fallingPiece):
-                        fallingPiece['rotation'] = (fallingPiece['rotation'] + 1) % len(PIECES[fallingPiece['shape']])
-
-                # making the piece fall faster with the down key
-                elif (event.key == K_DOWN or event.key == K_s):
-                    movingDown = True
-                    if isValidPosition(board, fallingPiece, adjY=1):
-                        fallingPiece['y'] += 1
-                    lastMoveDownTime = time.time()
-
-                # move the current piece all the way down
-                elif event.key == K_SPACE:
-                    movingDown = False
-                    movingLeft = False
-                    movingRight = False
-                    for i in range(1, BOARDHEIGHT):
-                        if not isValidPosition(board, fallingPiece, adjY=i):
-                            break
-                    fallingPiece['y'] += i - 1
+                game.pressKey(event.key)
+
+        game.tick()
+
+        # drawing everything on the screen
+        game.draw()
+        FPSCLOCK.tick(FPS)
+
+
+class TetrisEnv(object):
+    # A game of Tetris driven by a simulated clock. Each tick advances the game by
+    # one frame of 1 / FPS seconds, and all timing is counted in frames, so the game
+    # runs as fast as it is ticked and replays exactly from the same seed.
+
+    def __init__(self, display=False, seed=None, rng=None):
+        # display: if true, open a window and draw every frame to it.
+        # seed: seed for the random pieces. rng: the random generator to use instead.
+        self.display = display
+        self.rng = rng if rng is not None else random.Random(seed)
+        self.texts = {} # name -> (text, surface, rect) of the status text drawn
+        if display:
+            initDisplay()
+        self.reset()
+
+    def reset(self):
+        # Start a new game and return its first frame.
+        self.board = getBlankBoard()
+        self.frame = 0
+        self.lastMoveDownFrame = 0
+        self.lastMoveSidewaysFrame = 0
+        self.lastFallFrame = 0
+        self.movingDown = False # note: there is no movingUp variable
+        self.movingLeft = False
+        self.movingRight = False
+        self.heldKey = None
+        self.score = 0
+        self.level, self.fallFreq = calculateLevelAndFallFreq(self.score)
+        self.fallingPiece = getNewPiece(self.rng)
+        self.nextPiece = getNewPiece(self.rng)
+        self.redrawAll = True # the next draw() redraws the whole window
+        return self.render()
+
+    def secondsSince(self, frame):
+        # Return the simulated seconds since the given frame.
+        return (self.frame - frame) / float(FPS)
+
+    def step(self, action):
+        # Advance the game by one frame with the given key held down (K_UNKNOWN for
+        # none), like a player pressing and releasing keys between frames. Return the
+        # new frame, the reward (the squared number of lines removed, or a penalty for
+        # the blank spaces left at game over) and whether the game ended. A new game
+        # starts on the next step after a game over.
+        if not self.startPiece():
+            reward = .35 * getBlankSpaces(self.board)
+            self.reset()
+            return self.render(), reward, True
+
+        if action != self.heldKey:
+            if self.heldKey is not None:
+                self.releaseKey(self.heldKey)
+            self.pressKey(action)
+            self.heldKey = action
+
+        linesRemoved = self.tick()
+        if self.display:
+            self.draw()
+        return self.render(), float(linesRemoved * linesRemoved), False
+
+    def startPiece(self):
+        # If no piece is falling, start the next one at the top. Return False if it
+        # doesn't fit on the board, i.e. the game is over.
+        if self.fallingPiece == None:
+            # No falling piece in play, so start a new piece at the top
+            self.fallingPiece = self.nextPiece
+            self.nextPiece = getNewPiece(self.rng)
+            self.lastFallFrame = self.frame # reset lastFallFrame
+        return isValidPosition(self.board, self.fallingPiece)
+
+    def releaseKey(self, key):
+        if (key == K_LEFT or key == K_a):
+            self.movingLeft = False
+        elif (key == K_RIGHT or key == K_d):
+            self.movingRight = False
+        elif (key == K_DOWN or key == K_s):
+            self.movingDown = False
+
+    def pressKey(self, key):
+        board, fallingPiece = self.board, self.fallingPiece
+        # moving the piece sideways
+        if (key == K_LEFT or key == K_a) and isValidPosition(board, fallingPiece, adjX=-1):
+            fallingPiece['x'] -= 1
+            self.movingLeft = True
+            self.movingRight = False
+            self.lastMoveSidewaysFrame = self.frame
+
+        elif (key == K_RIGHT or key == K_d) and isValidPosition(board, fallingPiece, adjX=1):
+            fallingPiece['x'] += 1
+            self.movingRight = True
+            self.movingLeft = False
+            self.lastMoveSidewaysFrame = self.frame
+
+        # rotating the piece (if there is room to rotate)
+        elif (key == K_UP or key == K_w):
+            fallingPiece['rotation'] = (fallingPiece['rotation'] + 1) % len(PIECES[fallingPiece['shape']])
+            if not isValidPosition(board, fallingPiece):
+                fallingPiece['rotation'] = (fallingPiece['rotation'] - 1) % len(PIECES[fallingPiece['shape']])
+        elif (key == K_q): # rotate the other direction
+            fallingPiece['rotation'] = (fallingPiece['rotation'] - 1) % len(PIECES[fallingPiece['shape']])
+            if not isValidPosition(board, fallingPiece):
+                fallingPiece['rotation'] = (fallingPiece['rotation'] + 1) % len(PIECES[fallingPiece['shape']])
+
+        # making the piece fall faster with the down key
+        elif (key == K_DOWN or key == K_s):
+            self.movingDown = True
+            if isValidPosition(board, fallingPiece, adjY=1):
+                fallingPiece['y'] += 1
+            self.lastMoveDownFrame = self.frame
+
+        # move the current piece all the way down
+        elif key == K_SPACE:
+            self.movingDown = False
+            self.movingLeft = False
+            self.movingRight = False
+            for i in range(1, BOARDHEIGHT):
+                if not isValidPosition(board, fallingPiece, adjY=i):
+                    break
+            fallingPiece['y'] += i - 1
+
+    def tick(self):
+        # Apply held keys and gravity, then advance the clock by one frame. Return
+        # the number of lines removed.
+        board, fallingPiece = self.board, self.fallingPiece
+        linesRemoved = 0
 
         # handle moving the piece because of user input
-        if (movingLeft or movingRight) and time.time() - lastMoveSidewaysTime > MOVESIDEWAYSFREQ:
-            if movingLeft and isValidPosition(board, fallingPiece, adjX=-1):
+        if (self.movingLeft or self.movingRight) and self.secondsSince(self.lastMoveSidewaysFrame) > MOVESIDEWAYSFREQ:
+            if self.movingLeft and isValidPosition(board, fallingPiece, adjX=-1):
                 fallingPiece['x'] -= 1
-            elif movingRight and isValidPosition(board, fallingPiece, adjX=1):
+            elif self.movingRight and isValidPosition(board, fallingPiece, adjX=1):
                 fallingPiece['x'] += 1
-            lastMoveSidewaysTime = time.time()
+            self.lastMoveSidewaysFrame = self.frame
 
-        if movingDown and time.time() - lastMoveDownTime > MOVEDOWNFREQ and isValidPosition(board, fallingPiece, adjY=1):
+        if self.movingDown and self.secondsSince(self.lastMoveDownFrame) > MOVEDOWNFREQ and isValidPosition(board, fallingPiece, adjY=1):
             fallingPiece['y'] += 1
-            lastMoveDownTime = time.time()
+            self.lastMoveDownFrame = self.frame
 
         # let the piece fall if it is time to fall
-        if time.time() - lastFallTime > fallFreq:
+        if self.secondsSince(self.lastFallFrame) > self.fallFreq:
             # see if the piece has landed
             if not isValidPosition(board, fallingPiece, adjY=1):
                 # falling piece has landed, set it on the board
                 addToBoard(board, fallingPiece)
-                score += removeCompleteLines(board)
-                level, fallFreq = calculateLevelAndFallFreq(score)
-                fallingPiece = None
+                linesRemoved = removeCompleteLines(board)
+                self.score += linesRemoved
+                self.level, self.fallFreq = calculateLevelAndFallFreq(self.score)
+                self.fallingPiece = None
             else:
                 # piece did not land, just move the piece down
                 fallingPiece['y'] += 1
-                lastFallTime = time.time()
-
-        # drawing everything on the screen
-        DISPLAYSURF.fill(BGCOLOR)
-        drawBoard(board)
-        drawStatus(score, level)
-        drawNextPiece(nextPiece)#Here
-        if fallingPiece != None:
-            drawPiece(fallingPiece)
-
-        pygame.display.update()
-        FPSCLOCK.tick(FPS)
+                self.lastFallFrame = self.frame
+
+        self.frame += 1
+        return linesRemoved
+
+    def placements(self):
+        # Return the final positions the falling piece can be dropped into. See
+        # getPlacements.
+        self.startPiece()
+        return getPlacements(self.board, self.fallingPiece)
+
+    def afterstates(self, placements):
+        # Return what the board would look like after each of the placements, as an
+        # N x BOARDWIDTH x BOARDHEIGHT array of frames like render()'s, along with the
+        # reward each placement earns and whether it ends the game (when the next
+        # piece can't fit on the board), as in step().
+        frames = np.empty((len(placements), BOARDWIDTH, BOARDHEIGHT), dtype=np.uint8)
+        rewards = np.empty(len(placements), dtype=np.float32)
+        terminals = np.empty(len(placements), dtype=np.bool_)
+        for i, placement in enumerate(placements):
+            rows, linesRemoved = getAfterstate(self.board, placement)
+            frames[i] = getBoardImage(rows)
+            rewards[i] = linesRemoved * linesRemoved
+            terminals[i] = not isValidPosition({'rows': rows}, self.nextPiece)
+            if terminals[i]:
+                rewards[i] += .35 * getBlankSpaces({'rows': rows})
+        return frames, rewards, terminals
+
+    def place(self, placement):
+        # Drop the falling piece into one of the placements and start the next piece,
+        # all at once. Return the new frame, the reward and whether the game ended, like
+        # step(). A new game starts right away after a game over.
+        self.fallingPiece = placement
+        addToBoard(self.board, placement)
+        linesRemoved = removeCompleteLines(self.board)
+        self.score += linesRemoved
+        self.level, self.fallFreq = calculateLevelAndFallFreq(self.score)
+        self.fallingPiece = None
+        reward = float(linesRemoved * linesRemoved)
+        if not self.startPiece():
+            reward += .35 * getBlankSpaces(self.board)
+            self.reset()
+            return self.render(), reward, True
+        if self.display:
+            self.draw()
+        return self.render(), reward, False
+
+    def render(self):
+        # Return the board and falling piece as a frame. See getBoardImage.
+        rows = self.board['rows']
+        if self.fallingPiece != None:
+            rows = rows[:]
+            piece = self.fallingPiece
+            for y, mask in PIECEMASKS[piece['shape']][piece['rotation']]:
+                boardY = y + piece['y']
+                if 0 <= boardY < BOARDHEIGHT:
+                    rows[boardY] |= mask << (piece['x'] + WALLWIDTH)
+        return getBoardImage(rows)
+
+    def draw(self):
+        # Draw the current frame to the window. After the first frame, only the board
+        # boxes, status text and next piece that changed since the last frame are
+        # redrawn, and only their parts of the window are updated.
+        dirtyRects = []
+        colors = self.board['colors']
+        if self.redrawAll:
+            DISPLAYSURF.fill(BGCOLOR)
+            drawBoard(self.board)
+            self.drawnColors = [row[:] for row in colors]
+            self.drawnAbove = {} # rows above the board covered by the falling piece
+            # the window above the board, to restore what the piece covered there
+            self.aboveBoard = DISPLAYSURF.subsurface((XMARGIN, 0, BOARDWIDTH * BOXSIZE, TOPMARGIN)).copy()
+            self.drawnNextPiece = None
+
+        # the colors of the rows covered by the falling piece
+        pieceRows = {}
+        if self.fallingPiece != None:
+            piece = self.fallingPiece
+            for y, mask in PIECEMASKS[piece['shape']][piece['rotation']]:
+                boardY = y + piece['y']
+                row = pieceRows[boardY] = colors[boardY][:] if boardY >= 0 else [BLANK] * BOARDWIDTH
+                for x in range(TEMPLATEWIDTH):
+                    # boxes above the board can stick out past its sides
+                    if mask >> x & 1 and 0 <= x + piece['x'] < BOARDWIDTH:
+                        row[x + piece['x']] = piece['color']
+
+        # the piece can stick out above the board, over its border
+        for y in set(self.drawnAbove) | set(y for y in pieceRows if y < 0):
+            row = pieceRows.get(y, [BLANK] * BOARDWIDTH)
+            if row != self.drawnAbove.get(y):
+                dirtyRects.append(drawRowAboveBoard(y, row, self.aboveBoard))
+                self.drawnAbove[y] = row
+
+        # redraw the boxes that changed, and update one rect per changed row
+        for y in range(BOARDHEIGHT):
+            row = pieceRows.get(y, colors[y])
+            drawnRow = self.drawnColors[y]
+            if row != drawnRow:
+                changed = [x for x in range(BOARDWIDTH) if row[x] != drawnRow[x]]
+                for x in changed:
+                    drawCell(x, y, row[x])
+                pixelx, pixely = convertToPixelCoords(changed[0], y)
+                dirtyRects.append((pixelx, pixely, (changed[-1] - changed[0] + 1) * BOXSIZE, BOXSIZE))
+                self.drawnColors[y] = row[:]
+
+        dirtyRects += self.drawText('score', 'Score: %s' % self.score, (WINDOWWIDTH - 150, 20))
+        dirtyRects += self.drawText('level', 'Level: %s' % self.level, (WINDOWWIDTH - 150, 50))
+        dirtyRects += self.drawText('next', 'Next:', (WINDOWWIDTH - 120, 80))
+        if self.nextPiece is not self.drawnNextPiece:
+            nextRect = (WINDOWWIDTH - 120, 100, TEMPLATEWIDTH * BOXSIZE, TEMPLATEHEIGHT * BOXSIZE)
+            DISPLAYSURF.fill(BGCOLOR, nextRect)
+            drawPiece(self.nextPiece, pixelx=WINDOWWIDTH-120, pixely=100)
+            dirtyRects.append(nextRect)
+            self.drawnNextPiece = self.nextPiece
+
+        if self.redrawAll:
+            self.redrawAll = False
+            pygame.display.update()
+        else:
+            pygame.display.update(dirtyRects)
+
+    def drawText(self, name, text, topleft):
+        # Draw a line of status text at topleft, rendering it again only when the
+        # text changes. Return the rects of the window that changed.
+        oldText, textSurf, textRect = self.texts.get(name, (None, None, None))
+        if text == oldText and not self.redrawAll:
+            return []
+        dirtyRects = []
+        if text != oldText:
+            if textRect is not None:
+                DISPLAYSURF.fill(BGCOLOR, textRect) # erase the old text
+                dirtyRects.append(textRect)
+            textSurf = BASICFONT.render(text, True, TEXTCOLOR)
+            textRect = textSurf.get_rect()
+            textRect.topleft = topleft
+            self.texts[name] = (text, textSurf, textRect)
+        DISPLAYSURF.blit(textSurf, textRect)
+        dirtyRects.append(textRect)
+        return dirtyRects
 
 
 def makeTextObjs(text, font, color):
@@ -365,31 +593,84 @@ def calculateLevelAndFallFreq(score):
     fallFreq = 0.27 - (level * 0.02)
     return level, fallFreq
 
-def getNewPiece():
+def getNewPiece(rng=random):
     # return a random new piece in a random rotation and color
-    shape = random.choice(list(PIECES.keys()))
+    shape = rng.choice(list(PIECES.keys()))
     newPiece = {'shape': shape,
-                'rotation': random.randint(0, len(PIECES[shape]) - 1),
+                'rotation': rng.randint(0, len(PIECES[shape]) - 1),
                 'x': int(BOARDWIDTH / 2) - int(TEMPLATEWIDTH / 2),
                 'y': -2, # start it above the board (i.e. less than 0)
-                'color': random.randint(0, len(COLORS)-1)}
+                'color': rng.randint(0, len(COLORS)-1)}
     return newPiece
 
 
 def addToBoard(board, piece):
     # fill in the board based on piece's location, shape, and rotation
-    for x in range(TEMPLATEWIDTH):
-        for y in range(TEMPLATEHEIGHT):
-            if PIECES[piece['shape']][piece['rotation']][y][x] != BLANK:
-                board[x + piece['x']][y + piece['y']] = piece['color']
+    shift = piece['x'] + WALLWIDTH
+    for y, mask in PIECEMASKS[piece['shape']][piece['rotation']]:
+        boardY = y + piece['y']
+        if boardY < 0:
+            continue
+        board['rows'][boardY] |= mask << shift
+        colors = board['colors'][boardY]
+        for x in range(TEMPLATEWIDTH):
+            if mask >> x & 1:
+                colors[x + piece['x']] = piece['color']
+
+
+def getAfterstate(board, piece):
+    # Return the rows the board would have after the piece lands where it is and the
+    # complete lines are removed, and the number of lines removed. The board is not
+    # changed.
+    rows = board['rows'][:]
+    shift = piece['x'] + WALLWIDTH
+    for y, mask in PIECEMASKS[piece['shape']][piece['rotation']]:
+        if y + piece['y'] >= 0:
+            rows[y + piece['y']] |= mask << shift
+    kept = [row for row in rows if row != FULLROW]
+    numLinesRemoved = BOARDHEIGHT - len(kept)
+    return [EMPTYROW] * numLinesRemoved + kept, numLinesRemoved
+
+
+def getPlacements(board, piece):
+    # Return a piece for every final position the given piece can reach from where it
+    # is: turned with either rotate key, slid sideways, then dropped straight down.
+    rotations = [piece['rotation']]
+    for direction in (1, -1):
+        turned = dict(piece)
+        for i in range(len(PIECES[piece['shape']]) - 1):
+            turned['rotation'] = (turned['rotation'] + direction) % len(PIECES[piece['shape']])
+            if turned['rotation'] in rotations or not isValidPosition(board, turned):
+                break
+            rotations.append(turned['rotation'])
+
+    placements = []
+    for rotation in rotations:
+        turned = dict(piece, rotation=rotation)
+        for direction in (-1, 1):
+            adjX = 0 if direction < 0 else 1
+            while isValidPosition(board, turned, adjX=adjX):
+                adjY = 0
+                while isValidPosition(board, turned, adjX=adjX, adjY=adjY + 1):
+                    adjY += 1
+                placements.append(dict(turned, x=turned['x'] + adjX, y=turned['y'] + adjY))
+                adjX += direction
+    return placements
+
+
+def getBoardImage(rows):
+    # Return the board rows as a BOARDWIDTH x BOARDHEIGHT uint8 array (x first, like
+    # pygame.surfarray), 255 where there is a box.
+    rows = np.array(rows)
+    boxes = (rows[np.newaxis, :] >> np.arange(WALLWIDTH, WALLWIDTH + BOARDWIDTH)[:, np.newaxis]) & 1
+    return (boxes * 255).astype(np.uint8)
 
 
 def getBlankBoard():
-    # create and return a new blank board data structure
-    board = []
-    for i in range(BOARDWIDTH):
-        board.append([BLANK] * BOARDHEIGHT)
-    return board
+    # create and return a new blank board data structure: a bitmask and a list of
+    # colors for each row
+    return {'rows': [EMPTYROW] * BOARDHEIGHT,
+            'colors': [[BLANK] * BOARDWIDTH for i in range(BOARDHEIGHT)]}
 
 
 def isOnBoard(x, y):
@@ -397,45 +678,32 @@ def isOnBoard(x, y):
 
 
 def isValidPosition(board, piece, adjX=0, adjY=0):
-    # Return True if the piece is within the board and not colliding
-    for x in range(TEMPLATEWIDTH):
-        for y in range(TEMPLATEHEIGHT):
-            isAboveBoard = y + piece['y'] + adjY < 0
-            if isAboveBoard or PIECES[piece['shape']][piece['rotation']][y][x] == BLANK:
-                continue
-            if not isOnBoard(x + piece['x'] + adjX, y + piece['y'] + adjY):
-                return False
-            if board[x + piece['x'] + adjX][y + piece['y'] + adjY] != BLANK:
-                return False
+    # Return True if the piece is within the board and not colliding. Rows above
+    # the board are never checked.
+    rows = board['rows']
+    shift = piece['x'] + adjX + WALLWIDTH
+    for y, mask in PIECEMASKS[piece['shape']][piece['rotation']]:
+        boardY = y + piece['y'] + adjY
+        if boardY < 0:
+            continue
+        if boardY >= BOARDHEIGHT or rows[boardY] & (mask << shift):
+            return False
     return True
 
 def isCompleteLine(board, y):
     # Return True if the line filled with boxes with no gaps.
-    for x in range(BOARDWIDTH):
-        if board[x][y] == BLANK:
-            return False
-    return True
+    return board['rows'][y] == FULLROW
 
 
 def removeCompleteLines(board):
     # Remove any completed lines on the board, move everything above them down, and return the number of complete lines.
-    numLinesRemoved = 0
-    y = BOARDHEIGHT - 1 # start y at the bottom of the board
-    while y >= 0:
-        if isCompleteLine(board, y):
-            # Remove the line and pull boxes down by one line.
-            for pullDownY in range(y, 0, -1):
-                for x in range(BOARDWIDTH):
-                    board[x][pullDownY] = board[x][pullDownY-1]
-            # Set very top line to blank.
-            for x in range(BOARDWIDTH):
-                board[x][0] = BLANK
-            numLinesRemoved += 1
-            # Note on the next iteration of the loop, y is the same.
-            # This is so that if the line that was pulled down is also
-            # complete, it will be removed.
-        else:
-            y -= 1 # move on to check next row up
+    rows, colors = board['rows'], board['colors']
+    kept = [y for y in range(BOARDHEIGHT) if rows[y] != FULLROW]
+    numLinesRemoved = BOARDHEIGHT - len(kept)
+    if numLinesRemoved:
+        # Compact the remaining rows to the bottom and add blank rows at the top.
+        rows[:] = [EMPTYROW] * numLinesRemoved + [rows[y] for y in kept]
+        colors[:] = [[BLANK] * BOARDWIDTH for i in range(numLinesRemoved)] + [colors[y] for y in kept]
     return numLinesRemoved
 
 
@@ -458,6 +726,25 @@ def drawBox(boxx, boxy, color, pixelx=None, pixely=None):
     pygame.draw.rect(DISPLAYSURF, LIGHTCOLORS[color], (pixelx + 1, pixely + 1, BOXSIZE - 4, BOXSIZE - 4))
 
 
+def drawCell(boxx, boxy, color):
+    # clear a box of the board to the background, then draw the color (if any) in it
+    pixelx, pixely = convertToPixelCoords(boxx, boxy)
+    DISPLAYSURF.fill(BGCOLOR, (pixelx, pixely, BOXSIZE, BOXSIZE))
+    drawBox(None, None, color, pixelx, pixely)
+
+
+def drawRowAboveBoard(boxy, colors, aboveBoard):
+    # redraw a row above the board (boxy < 0), where the falling piece can cover
+    # the border, and return its rect. aboveBoard is a copy of the window above the
+    # board as drawn without any piece, from which the border is restored as it was.
+    pixelx, pixely = convertToPixelCoords(0, boxy)
+    rowRect = (pixelx, pixely, BOARDWIDTH * BOXSIZE, BOXSIZE)
+    DISPLAYSURF.blit(aboveBoard, rowRect, (0, pixely, BOARDWIDTH * BOXSIZE, BOXSIZE))
+    for x in range(BOARDWIDTH):
+        drawBox(x, boxy, colors[x])
+    return rowRect
+
+
 def drawBoard(board):
     # draw the border around the board
     pygame.draw.rect(DISPLAYSURF, BORDERCOLOR, (XMARGIN - 3, TOPMARGIN - 7, (BOARDWIDTH * BOXSIZE) + 8, (BOARDHEIGHT * BOXSIZE) + 8), 5)
@@ -465,9 +752,10 @@ def drawBoard(board):
     # fill the background of the board
     pygame.draw.rect(DISPLAYSURF, BGCOLOR, (XMARGIN, TOPMARGIN, BOXSIZE * BOARDWIDTH, BOXSIZE * BOARDHEIGHT))
     # draw the individual boxes on the board
-    for x in range(BOARDWIDTH):
-        for y in range(BOARDHEIGHT):
-            drawBox(x, y, board[x][y])
+    for y in range(BOARDHEIGHT):
+        if board['rows'][y] != EMPTYROW:
+            for x in range(BOARDWIDTH):
+                drawBox(x, y, board['colors'][y][x])
 
 
 def drawStatus(score, level):
@@ -506,16 +794,17 @@ def drawNextPiece(piece):
     # draw the "next" piece
     drawPiece(piece, pixelx=WINDOWWIDTH-120, pixely=100)
 
+def getBlankSpaces(board):
+    # Return minus the number of blank spaces on the board.
+    blankSpaces = 0
+    for row in board['rows']:
+        blankSpaces -= BOARDWIDTH - bin(row & BOARDBITS).count('1')
+    return blankSpaces
+
 def calculateBlackSpace():
     global blankSpaces
     global board
-    blankSpaces = 0
-    y = BOARDHEIGHT - 1
-    while y >=0:
-        for x in range(BOARDWIDTH):
-            if board[x][y] == BLANK:
-                blankSpaces -= 1
-        y -= 1
+    blankSpaces = getBlankSpaces(board)
     
 if __name__ == '__main__':
     main()
@@ -0,0 +1,87 @@
+"""Actor processes that play games and send their experience to a central learner.
+
+This module does not import TensorFlow: actors choose actions with NumpyQNet, using
+the weights the learner last published.
+"""
+import random
+from learner.config import *
+from learner.framestack import FrameStack
+from learner.npnet import NumpyQNet
+from learner.preprocess import FramePreprocessor
+import numpy as np
+
+
+def exploration_rates(num_actors, base=ACTOR_EXPLORATION_BASE, alpha=ACTOR_EXPLORATION_ALPHA):
+    """Returns the exploration rate of each actor, from most to least exploratory.
+
+    Args:
+        num_actors: The number of actors.
+        base: The exploration rate of the first actor.
+        alpha: How quickly exploration falls off across the actors.
+    """
+    if num_actors == 1:
+        return [base]
+    return [base ** (1 + i / float(num_actors - 1) * alpha) for i in range(num_actors)]
+
+
+def run_actor(index, env_fn, actions, exploration_rate, transitions, weights_path,
+              weights_version):
+    """Plays a game forever, sending batches of transitions to the learner.
+
+    Until the learner first publishes weights, every action is random.
+
+    Args:
+        index: The index of this actor, which is also the replay shard it fills.
+        env_fn: Function creating the game. The game must provide reset(), returning
+            the first frame, and step(action), returning the next frame, the reward and
+            whether the episode ended.
+        actions: List of viable actions to pass to the game.
+        exploration_rate: Probability of taking a random action.
+        transitions: Queue to put (index, frames, actions, rewards, terminals) batches on.
+        weights_path: Path of the weights published by the learner.
+        weights_version: Shared integer the learner increments after publishing.
+    """
+    env = env_fn()
+    preprocessor = FramePreprocessor()
+    frame_stack = FrameStack()
+    frame_stack.push(preprocessor(env.reset()))
+    net = None
+    version = 0
+
+    frames = np.empty((ACTOR_SEND_SIZE, FRAME_HEIGHT, FRAME_WIDTH), dtype=np.uint8)
+    action_indices = np.empty(ACTOR_SEND_SIZE, dtype=np.int32)
+    rewards = np.empty(ACTOR_SEND_SIZE, dtype=np.float32)
+    terminals = np.empty(ACTOR_SEND_SIZE, dtype=np.bool_)
+    count = 0
+
+    while True:
+        if weights_version.value != version:
+            version = weights_version.value
+            net = NumpyQNet(weights_path)
+
+        if net is None or random.random() < exploration_rate:
+            action = random.randrange(len(actions))
+        else:
+            action = int(np.argmax(net.compute_q(frame_stack.state())))
+
+        # Repeat the action like DeepQLearner does, summing its rewards.
+        reward = 0
+        for _ in range(ACTION_REPEAT):
+            frame, step_reward, terminal = env.step(actions[action])
+            reward += step_reward
+            if terminal:
+                frame = env.reset()
+                break
+
+        frames[count] = frame_stack.newest_frame()
+        action_indices[count] = action
+        rewards[count] = reward
+        terminals[count] = terminal
+        count += 1
+        if count == ACTOR_SEND_SIZE:
+            # The queue pickles on a background thread, so send copies.
+            transitions.put(
+                (index, frames.copy(), action_indices.copy(), rewards.copy(), terminals.copy()))
+            count = 0
+
+        frame_stack.push(preprocessor(frame))
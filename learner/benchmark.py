@@ -0,0 +1,71 @@
+"""Benchmarks the cost of the network at several input resolutions.
+
+Run with `python3 -m learner.benchmark`.
+"""
+import time
+from learner.config import *
+import learner.graph as graph
+import numpy as np
+import tensorflow as tf
+
+
+# Input resolutions to benchmark, as (height, width).
+RESOLUTIONS = [(42, 42), (64, 64), (84, 84)]
+
+# Number of timed runs per measurement, after one untimed warm-up run.
+RUNS = 50
+
+
+def benchmark(frame_shape, output_width=3, batch_size=BATCH_SIZE, runs=RUNS):
+    """Times a forward pass and a full update of the network on random minibatches.
+
+    Args:
+        frame_shape: The (height, width) of the input frames.
+        output_width: The number of output units.
+        batch_size: The number of states per minibatch.
+        runs: The number of timed runs.
+
+    Returns:
+        The mean forward and update times in seconds, and the number of trainable
+        parameters (in that order).
+    """
+    with tf.Graph().as_default():
+        graph_in, graph_out = graph.construct_graph(output_width, frame_shape=frame_shape)
+        targets = tf.placeholder(tf.float32, shape=[None, output_width])
+        loss = tf.reduce_mean(tf.square(targets - graph_out))
+        optimizer = tf.train.AdamOptimizer(LEARNING_RATE).minimize(loss)
+        parameters = sum(v.get_shape().num_elements() for v in tf.trainable_variables())
+
+        states = np.random.rand(
+            batch_size, frame_shape[0], frame_shape[1], STATE_FRAMES).astype(np.float32)
+        batch_targets = np.random.rand(batch_size, output_width).astype(np.float32)
+
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            forward = time_calls(lambda: sess.run(graph_out, feed_dict={graph_in:states}), runs)
+            update = time_calls(lambda: sess.run(
+                optimizer, feed_dict={graph_in:states, targets:batch_targets}), runs)
+
+    return forward, update, parameters
+
+
+def time_calls(function, runs=RUNS):
+    """Returns the mean time in seconds of calling the function, after one warm-up call.
+
+    Args:
+        function: The function to time.
+        runs: The number of timed calls.
+    """
+    function()
+    start = time.perf_counter()
+    for _ in range(runs):
+        function()
+    return (time.perf_counter() - start) / runs
+
+
+if __name__ == '__main__':
+    print('%-10s %12s %12s %12s' % ('input', 'forward ms', 'update ms', 'parameters'))
+    for shape in RESOLUTIONS:
+        forward, update, parameters = benchmark(shape)
+        print('%-10s %12.2f %12.2f %12d' % (
+            '%dx%d' % shape, forward * 1000, update * 1000, parameters))
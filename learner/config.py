@@ -1,4 +1,6 @@
 """Defines hyperparameters and runtime settings for the Deep Q-Network."""
+import json as _json
+import os as _os
 
 # The network learning rate.
 LEARNING_RATE = 1e-6
@@ -20,6 +22,21 @@ FINAL_EXPLORATION_TIME = 1000000
 # of potential future rewards by multiplying by this constant.
 DISCOUNT = 0.9
 
+# The number of rewards summed (with discounting) into each replayed return
+# before bootstrapping from the network. One gives the standard Q-learning target.
+N_STEP_RETURNS = 1
+
+# Whether to compute targets with a frozen copy of the network (a target
+# network) that is only synced with the learned weights periodically.
+TARGET_NETWORK = False
+
+# How many network updates pass between target network syncs.
+TARGET_SYNC_FREQUENCY = 10000
+
+# How many replay entries' target values to keep while the target network is
+# frozen. Cached values are dropped at every sync.
+TARGET_CACHE_SIZE = 100000
+
 # When the network's parameters are updated, we sample this many previous
 # state-action-reward triples to use as a training set for the network.
 BATCH_SIZE = 32
@@ -35,9 +52,81 @@ REPLAY_START_SIZE = 50000
 # Maximum size of the replay memory.
 REPLAY_MEMORY_SIZE = 100000
 
+# Whether to keep the replay memory in memory-mapped files in the checkpoint
+# directory instead of RAM. Allows memories larger than physical memory.
+REPLAY_ON_DISK = False
+
 # How many actions are to be performed between network updates.
 UPDATE_FREQUENCY = 4
 
+# Whether checkpoints should include a snapshot of the replay memory, so that
+# restored learners skip burn in. Always true for on-disk replay memories.
+SAVE_REPLAY_MEMORY = False
+
+# Codec with which to compress replay frames in RAM: None, 'zlib', 'lzma' or
+# 'rle' (run-length encoding). Ignored by the on-disk replay memory.
+REPLAY_COMPRESSION = None
+
+# Whether to sample transitions in proportion to their TD error rather than
+# uniformly.
+PRIORITIZED_REPLAY = False
+
+# How strongly TD errors skew prioritized sampling. Zero is uniform sampling.
+PRIORITY_ALPHA = 0.6
+
+# Initial exponent of the importance-sampling weights that correct for the
+# bias introduced by prioritized sampling.
+PRIORITY_BETA_START = 0.4
+
+# The number of minibatches over which the importance-sampling exponent is
+# annealed to 1 (full correction).
+PRIORITY_BETA_ANNEAL_TIME = (FINAL_EXPLORATION_TIME - REPLAY_START_SIZE) // UPDATE_FREQUENCY
+
+# Added to TD errors so that no transition has zero probability of being sampled.
+PRIORITY_EPSILON = 1e-6
+
+# Whether to preprocess frames and store transitions on a worker thread, so
+# that they overlap with network updates.
+PIPELINE_PREPROCESSING = False
+
+# Maximum number of jobs queued for the preprocessing worker.
+PIPELINE_QUEUE_SIZE = 4
+
+# Whether to run network updates continuously on a background thread instead of
+# inline every UPDATE_FREQUENCY actions, so the game loop never stalls on them.
+ASYNC_UPDATES = False
+
+# The replay ratio of background updates, in network updates per action taken.
+ASYNC_UPDATES_PER_ACTION = 1.0 / UPDATE_FREQUENCY
+
+# How many updates the background thread may fall behind the replay ratio before
+# the game loop waits for it.
+ASYNC_MAX_STALENESS = 8
+
+# The number of games of Pong or Half Pong simulated at once in batched mode.
+NUM_BATCH_GAMES = 64
+
+# The number of actor processes collecting experience in distributed mode.
+NUM_ACTORS = 4
+
+# Actor i of N explores with probability ACTOR_EXPLORATION_BASE ** (1 + i / (N - 1) *
+# ACTOR_EXPLORATION_ALPHA), so the actors span a range of exploration rates.
+ACTOR_EXPLORATION_BASE = 0.4
+ACTOR_EXPLORATION_ALPHA = 7
+
+# How many transitions an actor collects before sending them to the learner.
+ACTOR_SEND_SIZE = 64
+
+# How many network updates pass between publishing weights to the actors.
+ACTOR_SYNC_FREQUENCY = 400
+
+# Whether to feed network updates from a prefetching tf.data pipeline over the
+# replay memory instead of feed_dict. Targets are then computed in the graph.
+INPUT_PIPELINE = False
+
+# How many minibatches the input pipeline samples ahead of the network.
+INPUT_PREFETCH = 2
+
 # How often the Q-learner should log its state.
 LOG_FREQUENCY = 10000
 
@@ -50,7 +139,12 @@ LOG_IN_A_ROW = 1
 # How often the Q-learner should save its parameters.
 SAVE_FREQUENCY = 500000
 
-# Shape of the frames to use in the network.
+# Whether to also export the network weights to WEIGHTS_FILE whenever the parameters
+# are saved, so they can be loaded by NumpyQNet without TensorFlow.
+EXPORT_WEIGHTS = False
+
+# Shape of the frames to use in the network. Lower resolutions such as (42, 42) or
+# (64, 64) are much cheaper to train on; see learner/benchmark.py.
 FRAME_HEIGHT, FRAME_WIDTH = (84, 84)
 
 # The number of frames used in a state object.
@@ -62,8 +156,32 @@ DUELING_ARCHITECTURE = False
 # Whether to include pooling layers or not.
 POOLING_ARCHITECTURE = False
 
+# Layout of the network's convolutional layers, 'NHWC' or 'NCHW'.
+DATA_FORMAT = 'NHWC'
+
+# Threads TensorFlow uses within and across operations. Zero lets TensorFlow decide.
+INTRA_OP_THREADS = 0
+INTER_OP_THREADS = 0
+
 # Where to log score ratio.
 LOG_PATH = 'score_ratio_log.txt'
 
 # Where to save and load network weights to/from.
 CHK_PATH = './deep_q_model/'
+
+# Name scope of the target network's variables.
+TARGET_SCOPE = 'target'
+
+# Subdirectory of the checkpoint path holding the on-disk replay memory.
+REPLAY_DIR = 'replay'
+
+# File in the checkpoint path holding the network weights exported for NumpyQNet.
+WEIGHTS_FILE = 'weights.npz'
+
+# Settings tuned for this host by `python3 -m learner.tune`. If the file exists, its
+# settings (DATA_FORMAT and the thread counts) override those above.
+HOST_PROFILE_PATH = 'host_profile.json'
+
+if _os.path.exists(HOST_PROFILE_PATH):
+    with open(HOST_PROFILE_PATH) as _profile:
+        globals().update(_json.load(_profile)['settings'])
@@ -0,0 +1,158 @@
+"""Central learner for parallel experience collection by actor processes."""
+import multiprocessing
+import os
+import queue
+from learner.actor import exploration_rates, run_actor
+from learner.config import *
+from learner.qnet import QNet
+from learner.replay import ReplayShards, ReplayMemory, CompressedReplayMemory
+import numpy as np
+import tensorflow as tf
+
+
+class DistributedLearner(object):
+    """Trains a network on experience collected by several actor processes.
+
+    Each actor plays its own headless game with its own exploration rate, and sends its
+    transitions in batches to this process, which stores them in its own replay shard
+    and runs the network updates. Every ACTOR_SYNC_FREQUENCY updates, the weights are
+    published to the actors through WEIGHTS_FILE.
+
+    Actors are forked before TensorFlow creates its session, since a session does not
+    survive a fork.
+
+    Checkpoints are numbered like DeepQLearner's, by game frames played (transitions
+    received times ACTION_REPEAT), so either can restore the other's.
+    """
+
+    def __init__(self, env_fn, actions, num_actors=NUM_ACTORS, chk_path=CHK_PATH,
+                 restore=False):
+        """Starts the actor processes and builds the network.
+
+        Args:
+            env_fn: Function creating a game for an actor. See run_actor.
+            actions: List of viable actions the actors can take.
+            num_actors: The number of actor processes.
+            chk_path: File path to store saved weights.
+            restore: If true, will restore weights right away from chk_path. The replay
+                memory is not restored, so it is filled again before updates resume.
+        """
+        if REPLAY_ON_DISK or PRIORITIZED_REPLAY or SAVE_REPLAY_MEMORY:
+            raise Exception('Replay memory type is not supported by %d actors!' % num_actors)
+        self.actions = actions
+        self.chk_path = chk_path
+        self.weights_path = os.path.join(os.path.dirname(chk_path), WEIGHTS_FILE)
+        if not os.path.exists(os.path.dirname(chk_path)):
+            os.makedirs(os.path.dirname(chk_path))
+
+        context = multiprocessing.get_context('fork')
+        self.transitions = context.Queue(maxsize=4 * num_actors)
+        self.weights_version = context.Value('i', 0)
+        self.actors = []
+        for index, exploration_rate in enumerate(exploration_rates(num_actors)):
+            actor = context.Process(target=run_actor, args=(
+                index, env_fn, actions, exploration_rate, self.transitions,
+                self.weights_path, self.weights_version))
+            actor.daemon = True
+            actor.start()
+            self.actors.append(actor)
+
+        if REPLAY_COMPRESSION:
+            self.replay = ReplayShards(num_actors, make_shard=CompressedReplayMemory)
+        else:
+            self.replay = ReplayShards(num_actors, make_shard=ReplayMemory)
+        self.net = QNet(len(actions))
+        self.received = 0
+        self.updates = 0
+        if restore:
+            self.__restore()
+
+    def run(self, max_updates=None):
+        """Stores the actors' transitions and updates the network until stopped.
+
+        One update runs per UPDATE_FREQUENCY transitions received, as in DeepQLearner.
+        While there is no update due, this waits for the actors.
+
+        Args:
+            max_updates (optional): Stop after this many network updates.
+        """
+        while max_updates is None or self.updates < max_updates:
+            due = len(self.replay) >= REPLAY_START_SIZE and \
+                self.updates < self.received // UPDATE_FREQUENCY
+            self.__receive(block=not due)
+            if due:
+                self.__update_network()
+
+    def close(self):
+        """Stops the actor processes."""
+        for actor in self.actors:
+            actor.terminate()
+        for actor in self.actors:
+            actor.join()
+
+    def __receive(self, block):
+        """Stores every batch of transitions waiting on the queue.
+
+        Args:
+            block: If true, wait for at least one batch.
+        """
+        while True:
+            try:
+                index, frames, actions, rewards, terminals = self.transitions.get(
+                    block=block, timeout=1 if block else None)
+            except queue.Empty:
+                if not block:
+                    return
+                self.__check_actors()
+                continue
+            for frame, action, reward, terminal in zip(frames, actions, rewards, terminals):
+                self.replay.append(index, frame, action, terminal)
+                self.replay.observe_reward(index, reward)
+            self.received += len(frames)
+            block = False
+
+    def __check_actors(self):
+        """Raises if any actor process has exited, since its shard would never fill."""
+        for index, actor in enumerate(self.actors):
+            if not actor.is_alive():
+                raise Exception('Actor %d exited with code %s!' % (index, actor.exitcode))
+
+    def __publish_weights(self):
+        """Exports the weights for the actors and tells them to reload."""
+        self.net.export_weights(self.weights_path)
+        with self.weights_version.get_lock():
+            self.weights_version.value += 1
+
+    def __update_network(self):
+        """Updates the network with a minibatch sampled from all actors' experience,
+        publishing and saving the weights when due.
+        """
+        (batch_frames, batch_actions, batch_returns, batch_states_out, batch_dones,
+         batch_weights, _) = self.replay.sample(BATCH_SIZE)
+        future_rewards = np.amax(self.net.compute_target_q_batch(batch_states_out), axis=1)
+        future_rewards[batch_dones] = 0
+        batch_targets = batch_returns + DISCOUNT ** N_STEP_RETURNS * future_rewards
+        loss, _ = self.net.update(batch_frames, batch_actions, batch_targets, batch_weights)
+
+        self.updates += 1
+        if TARGET_NETWORK and self.updates % TARGET_SYNC_FREQUENCY == 0:
+            self.net.sync_target()
+        if self.updates % ACTOR_SYNC_FREQUENCY == 0:
+            self.__publish_weights()
+        if self.updates % LOG_FREQUENCY == 0:
+            print('Updates: %d, transitions: %d, loss: %0.9f' % (
+                self.updates, self.received, loss))
+        if self.updates % SAVE_FREQUENCY == 0:
+            self.net.saver.save(
+                self.net.sess, self.chk_path, global_step=self.received * ACTION_REPEAT)
+
+    def __restore(self):
+        """Restores the network from the checkpoint path and publishes it to the actors."""
+        if not os.path.exists(self.chk_path):
+            raise Exception('No such checkpoint path %s!' % self.chk_path)
+        model_path = tf.train.get_checkpoint_state(self.chk_path).model_checkpoint_path
+        self.received = int(model_path[(model_path.rfind('-')+1):]) // ACTION_REPEAT
+        self.updates = self.received // UPDATE_FREQUENCY
+        self.net.saver.restore(self.net.sess, model_path)
+        self.__publish_weights()
+        print('Network weights and transition count restored!')
@@ -0,0 +1,53 @@
+"""Circular buffer of the most recent preprocessed frames."""
+from learner.config import *
+import numpy as np
+
+
+class FrameStack(object):
+    """Holds the last few preprocessed frames without shifting them on every step.
+
+    New frames overwrite the oldest slot in place, and the stacked network state is
+    only materialized (newest frame first) when it is asked for.
+    """
+
+    def __init__(self, frame_shape=(FRAME_HEIGHT, FRAME_WIDTH), history=STATE_FRAMES,
+                 dtype=np.float32):
+        """Allocates the frame slots and the state buffer.
+
+        Args:
+            frame_shape: The (height, width) of a single preprocessed frame.
+            history: The number of frames stacked into one state.
+            dtype: The data type of materialized states.
+        """
+        self.history = history
+        self.frames = np.zeros((history,) + tuple(frame_shape), dtype=np.uint8)
+        self.state_buffer = np.empty(tuple(frame_shape) + (history,), dtype=dtype)
+        self.newest = -1
+
+    def push(self, frame):
+        """Adds a frame to the stack, overwriting the oldest. The first frame pushed
+        fills the whole stack.
+
+        Args:
+            frame: The newest preprocessed frame.
+        """
+        self.newest += 1
+        if self.newest == 0:
+            self.frames[:] = frame
+        else:
+            self.frames[self.newest % self.history] = frame
+
+    def newest_frame(self):
+        """Returns the newest frame."""
+        return self.frames[self.newest % self.history]
+
+    def state(self):
+        """Materializes the stacked state, newest frame first.
+
+        Returns:
+            A contiguous height x width x history array. The array is reused by the next
+            call, so copy it if it must outlive it.
+        """
+        for age in range(self.history):
+            self.state_buffer[:, :, age] = self.frames[(self.newest - age) % self.history]
+        return self.state_buffer
@@ -3,7 +3,7 @@ from learner.config import *
 import tensorflow as tf
 
 
-G_IN = 'frame_input'              # The graph input (84x84x4 frame sets).
+G_IN = 'frame_input'              # The graph input (e.g. 84x84x4 frame sets).
 G_CONV1_W = 'w_conv_1'            # First convolutional layer weights.
 G_CONV1_B = 'b_conv_1'            # First convolutional layer bias
 G_CONV2_W = 'w_conv_2'            # etc...
@@ -21,19 +21,28 @@ G_FC4_B = 'b_fc_4'
 G_OUT = 'q_value'                 # Graph output.
 
 
-def construct_graph(output_width):
+def construct_graph(output_width, default_in=None, frame_shape=(FRAME_HEIGHT, FRAME_WIDTH),
+                    data_format=DATA_FORMAT):
     """Creates a new TensorFlow graph with predetermined structure.
 
     Args:
         output_width: The number of output units for the graph.
+        default_in (optional): Tensor the graph input takes its value from when it
+            is not fed.
+        frame_shape: The (height, width) of the input frames. The fully connected
+            layers are sized to match.
+        data_format: The layout of the convolutional layers, 'NHWC' or 'NCHW'. The
+            input and the weights are always NHWC, so it does not affect checkpoints.
 
     Returns:
         The graph input and output tensors (in that order).
     """
-    graph_in = tf.placeholder(
-        tf.float32,
-        shape=[None, FRAME_HEIGHT, FRAME_WIDTH, STATE_FRAMES],
-        name=G_IN)
+    in_shape = [None, frame_shape[0], frame_shape[1], STATE_FRAMES]
+    if default_in is None:
+        graph_in = tf.placeholder(tf.float32, shape=in_shape, name=G_IN)
+    else:
+        graph_in = tf.placeholder_with_default(default_in, shape=in_shape, name=G_IN)
+    conv_in = graph_in if data_format == 'NHWC' else tf.transpose(graph_in, [0, 3, 1, 2])
 
     w_conv1 = _weight_variable([8, 8, STATE_FRAMES, 32], G_CONV1_W)
     b_conv1 = _bias_variable([32], G_CONV1_B)
@@ -43,17 +52,17 @@ def construct_graph(output_width):
     b_conv3 = _bias_variable([64], G_CONV3_B)
 
     if POOLING_ARCHITECTURE:
-        conv_layer1 = tf.nn.relu(_conv2d(graph_in, w_conv1, 4) + b_conv1)
-        pool_layer1 = _pool(conv_layer1)
+        conv_layer1 = tf.nn.relu(_conv2d(conv_in, w_conv1, b_conv1, 4, data_format))
+        pool_layer1 = _pool(conv_layer1, data_format=data_format)
 
-        conv_layer2 = tf.nn.relu(_conv2d(pool_layer1, w_conv2, 2) + b_conv2)
-        pool_layer2 = _pool(conv_layer2)
+        conv_layer2 = tf.nn.relu(_conv2d(pool_layer1, w_conv2, b_conv2, 2, data_format))
+        pool_layer2 = _pool(conv_layer2, data_format=data_format)
 
-        conv_layer3 = tf.nn.relu(_conv2d(pool_layer2, w_conv3, 1) + b_conv3)
-        pool_layer3 = _pool(conv_layer3)
+        conv_layer3 = tf.nn.relu(_conv2d(pool_layer2, w_conv3, b_conv3, 1, data_format))
+        pool_layer3 = _pool(conv_layer3, data_format=data_format)
 
-        conv_layer3_flat = tf.reshape(pool_layer3, [-1, 256])
-        w_fc1 = _weight_variable([256, 256], G_FC1_W)
+        conv_layer3_flat, flat_size = _flatten(pool_layer3, data_format)
+        w_fc1 = _weight_variable([flat_size, 256], G_FC1_W)
         b_fc1 = _bias_variable([256], G_FC1_B)
         fc_layer1 = tf.nn.relu(tf.matmul(conv_layer3_flat, w_fc1) + b_fc1)
 
@@ -62,24 +71,22 @@ def construct_graph(output_width):
         graph_out = tf.add(tf.matmul(fc_layer1, w_fc2), b_fc2, name=G_OUT)
 
     else:
-        conv_layer1 = tf.nn.relu(_conv2d(graph_in, w_conv1, 4) + b_conv1)
+        conv_layer1 = tf.nn.relu(_conv2d(conv_in, w_conv1, b_conv1, 4, data_format))
 
-        conv_layer2 = tf.nn.relu(_conv2d(conv_layer1, w_conv2, 2) + b_conv2)
+        conv_layer2 = tf.nn.relu(_conv2d(conv_layer1, w_conv2, b_conv2, 2, data_format))
 
-        conv_layer3 = tf.nn.relu(_conv2d(conv_layer2, w_conv3, 1) + b_conv3)
+        conv_layer3 = tf.nn.relu(_conv2d(conv_layer2, w_conv3, b_conv3, 1, data_format))
 
-        # TODO: Reshape this so we don't have to hardcode the the number of inputs
-        # and can freely change the frame height/width.
-        conv_layer3_flat = tf.reshape(conv_layer3, [-1, 7744])
+        conv_layer3_flat, flat_size = _flatten(conv_layer3, data_format)
 
         # Convolutional layer 3 to fully connected layer 1
-        w_fc1 = _weight_variable([7744, 512], G_FC1_W)
+        w_fc1 = _weight_variable([flat_size, 512], G_FC1_W)
         b_fc1 = _bias_variable([512], G_FC1_B)
         fc_layer1 = tf.nn.relu(tf.matmul(conv_layer3_flat, w_fc1) + b_fc1)
 
         if DUELING_ARCHITECTURE:
             # Convolutional layer 3 to fully connected layer 2
-            w_fc2 = _weight_variable([7744, 512], G_FC2_W)
+            w_fc2 = _weight_variable([flat_size, 512], G_FC2_W)
             b_fc2 = _bias_variable([512], G_FC2_B)
             fc_layer2 = tf.nn.relu(tf.matmul(conv_layer3_flat, w_fc2) + b_fc2)
 
@@ -109,34 +116,63 @@ def construct_graph(output_width):
     return graph_in, graph_out
 
 
-def _conv2d(data, weights, stride):
+def _conv2d(data, weights, bias, stride, data_format='NHWC'):
     """Returns a TensforFlow 2D convolutional layer.
 
     Args:
         data: The input tensor to the convolutional layer.
         weights: The convolutional weights for this layer.
+        bias: The bias for this layer.
         stride: The x and y stride for the convolution.
+        data_format: The layout of the input tensor, 'NHWC' or 'NCHW'.
 
     Returns:
         The TensorFlow convolutional layer.
     """
-    return tf.nn.conv2d(data, weights, strides=[1, stride, stride, 1], padding='SAME')
+    conv = tf.nn.conv2d(
+        data, weights, strides=_spatial(stride, data_format), padding='SAME',
+        data_format=data_format)
+    return tf.nn.bias_add(conv, bias, data_format=data_format)
 
 
-def _pool(data, stride=2):
+def _pool(data, stride=2, data_format='NHWC'):
     """Returns a TensforFlow pooling layer.
 
     Args:
         data: The input tensor to the pooling layer.
+        data_format: The layout of the input tensor, 'NHWC' or 'NCHW'.
 
     Returns:
         The TensorFlow pooling layer.
     """
     return tf.nn.max_pool(
         data,
-        ksize=[1, stride, stride, 1],
-        strides=[1, stride, stride, 1],
-        padding='SAME')
+        ksize=_spatial(stride, data_format),
+        strides=_spatial(stride, data_format),
+        padding='SAME',
+        data_format=data_format)
+
+
+def _spatial(size, data_format):
+    """Returns a 4D ksize/strides list applying the size to the spatial dimensions."""
+    return [1, size, size, 1] if data_format == 'NHWC' else [1, 1, size, size]
+
+
+def _flatten(data, data_format='NHWC'):
+    """Returns a TensorFlow layer flattening each example of the input. NCHW input is
+    transposed first, so the flattened units are in the same order for both layouts.
+
+    Args:
+        data: The input tensor, whose shape is static except for the batch dimension.
+        data_format: The layout of the input tensor, 'NHWC' or 'NCHW'.
+
+    Returns:
+        The flattened layer and the number of units per example (in that order).
+    """
+    if data_format == 'NCHW':
+        data = tf.transpose(data, [0, 2, 3, 1])
+    size = data.get_shape()[1:].num_elements()
+    return tf.reshape(data, [-1, size]), size
 
 
 def _weight_variable(shape, name):
@@ -0,0 +1,149 @@
+"""NumPy implementation of the network's forward pass, for acting without TensorFlow."""
+from learner.config import *
+import numpy as np
+
+
+# Variable names, mirroring the constants in learner.graph (which imports TensorFlow).
+W_CONV = ['w_conv_1', 'w_conv_2', 'w_conv_3']
+B_CONV = ['b_conv_1', 'b_conv_2', 'b_conv_3']
+CONV_STRIDES = [4, 2, 1]
+
+
+class NumpyQNet(object):
+    """Computes Q values from weights exported by QNet.export_weights.
+
+    Matches the output of the TensorFlow graph built by construct_graph with the same
+    architecture flags. Convolutions are lowered to one matrix product each by viewing
+    the padded input as overlapping patches, so a forward pass is a handful of BLAS
+    calls with no session overhead.
+    """
+
+    def __init__(self, weights, pooling=POOLING_ARCHITECTURE, dueling=DUELING_ARCHITECTURE):
+        """Loads the network weights.
+
+        Args:
+            weights: Path of an .npz file written by QNet.export_weights, or a dict
+                from variable names to arrays.
+            pooling: Whether the network has pooling layers.
+            dueling: Whether the network has the dueling architecture. Ignored if pooling
+                is set, like in construct_graph.
+        """
+        if isinstance(weights, str):
+            with np.load(weights) as archive:
+                weights = dict(archive)
+        self.weights = {name: np.asarray(value, dtype=np.float32)
+                        for name, value in weights.items()}
+        self.pooling = pooling
+        self.dueling = dueling and not pooling
+
+    def compute_q(self, net_in):
+        """Forward-propagates the given input and returns the array of outputs.
+
+        Args:
+            net_in: The 84x84x4 network input.
+
+        Returns:
+            The array of network outputs.
+        """
+        return self.compute_q_batch(net_in[np.newaxis])[0]
+
+    def compute_q_batch(self, batch_in):
+        """Forward-propagates a batch of inputs in a single pass.
+
+        Args:
+            batch_in: Nx84x84x4 array of network inputs.
+
+        Returns:
+            The NxA array of network outputs, where A is the output width.
+        """
+        w = self.weights
+        layer = np.asarray(batch_in, dtype=np.float32)
+        for w_name, b_name, stride in zip(W_CONV, B_CONV, CONV_STRIDES):
+            layer = _relu(_conv2d(layer, w[w_name], stride) + w[b_name])
+            if self.pooling:
+                layer = _pool(layer)
+        flat = layer.reshape(len(layer), -1)
+
+        fc_layer1 = _relu(flat.dot(w['w_fc_1']) + w['b_fc_1'])
+        if not self.dueling:
+            return fc_layer1.dot(w['w_fc_2']) + w['b_fc_2']
+
+        fc_layer2 = _relu(flat.dot(w['w_fc_2']) + w['b_fc_2'])
+        value_function = _relu(fc_layer1.dot(w['w_fc_3']) + w['b_fc_3'])
+        advantage_function = _relu(fc_layer2.dot(w['w_fc_4']) + w['b_fc_4'])
+        # Like the graph, subtract the max advantage over the whole batch.
+        return advantage_function - advantage_function.max() + value_function
+
+
+def _relu(data):
+    """Applies a rectified linear unit in place and returns the data."""
+    return np.maximum(data, 0, out=data)
+
+
+def _same_padding(size, window, stride):
+    """Returns the output size and the padding before and after a dimension, following
+    TensorFlow's SAME padding.
+
+    Args:
+        size: The input size.
+        window: The kernel or pooling window size.
+        stride: The stride.
+    """
+    out_size = -(-size // stride)
+    total = max((out_size - 1) * stride + window - size, 0)
+    return out_size, total // 2, total - total // 2
+
+
+def _patches(data, window, stride, fill):
+    """Returns a view of the SAME-padded data as windows.
+
+    Args:
+        data: NxHxWxC array.
+        window: The square window size.
+        stride: The stride between windows.
+        fill: The value to pad with.
+
+    Returns:
+        An N x out_height x out_width x window x window x C view.
+    """
+    n, height, width, channels = data.shape
+    out_height, top, bottom = _same_padding(height, window, stride)
+    out_width, left, right = _same_padding(width, window, stride)
+    if top or bottom or left or right:
+        data = np.pad(data, ((0, 0), (top, bottom), (left, right), (0, 0)),
+                      mode='constant', constant_values=fill)
+    s_n, s_h, s_w, s_c = data.strides
+    return np.lib.stride_tricks.as_strided(
+        data,
+        shape=(n, out_height, out_width, window, window, channels),
+        strides=(s_n, s_h * stride, s_w * stride, s_h, s_w, s_c),
+        writeable=False)
+
+
+def _conv2d(data, weights, stride):
+    """Convolves the data like TensorFlow's conv2d with SAME padding.
+
+    Args:
+        data: NxHxWxC input array.
+        weights: KxKxCxO kernel.
+        stride: The x and y stride for the convolution.
+
+    Returns:
+        The N x out_height x out_width x O output array.
+    """
+    window, _, channels, out_channels = weights.shape
+    patches = _patches(data, window, stride, 0)
+    n, out_height, out_width = patches.shape[:3]
+    columns = patches.reshape(n * out_height * out_width, window * window * channels)
+    result = columns.dot(weights.reshape(-1, out_channels))
+    return result.reshape(n, out_height, out_width, out_channels)
+
+
+def _pool(data, stride=2):
+    """Max-pools the data like TensorFlow's max_pool with SAME padding.
+
+    Args:
+        data: NxHxWxC input array.
+        stride: The window size and stride.
+    """
+    return _patches(data, stride, stride, -np.inf).max(axis=(3, 4))
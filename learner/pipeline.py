@@ -0,0 +1,67 @@
+"""Worker thread that overlaps frame preprocessing with network updates."""
+import queue
+import threading
+from learner.config import *
+
+
+class PreprocessPipeline(object):
+    """Runs frame preprocessing and replay insertion on a worker thread.
+
+    Jobs run in the order they are submitted. A submitted frame is processed while the
+    caller runs the network update, and wait() blocks until it is ready to act on. Both
+    NumPy and TensorFlow release the GIL in their heavy kernels, so the two overlap.
+    """
+
+    def __init__(self, process_frame, store_transition, queue_size=PIPELINE_QUEUE_SIZE):
+        """Starts the worker thread.
+
+        Args:
+            process_frame: Function run on the worker for each submitted frame.
+            store_transition: Function run on the worker for each submitted transition.
+            queue_size: Maximum number of jobs waiting for the worker.
+        """
+        self.process_frame = process_frame
+        self.store_transition = store_transition
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.ready = queue.Queue(maxsize=queue_size)
+        self.error = None
+
+        self.worker = threading.Thread(target=self.__work)
+        self.worker.daemon = True
+        self.worker.start()
+
+    def submit_frame(self, *args):
+        """Queues a call to process_frame with the given arguments."""
+        self.jobs.put((self.process_frame, args, True))
+
+    def submit_transition(self, *args):
+        """Queues a call to store_transition with the given arguments."""
+        self.jobs.put((self.store_transition, args, False))
+
+    def wait(self):
+        """Blocks until the oldest submitted frame has been processed. Re-raises any
+        error raised on the worker since the last call.
+        """
+        self.ready.get()
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def close(self):
+        """Finishes the queued jobs and stops the worker thread."""
+        self.jobs.put(None)
+        self.worker.join()
+
+    def __work(self):
+        """Runs queued jobs until closed."""
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            function, args, is_frame = job
+            try:
+                function(*args)
+            except Exception as error:
+                self.error = error
+            if is_frame:
+                self.ready.put(None)
@@ -0,0 +1,87 @@
+"""Fused grayscale conversion and area downsampling of game frames."""
+from learner.config import *
+import numpy as np
+
+
+class FramePreprocessor(object):
+    """Converts screen arrays to grayscale and area-downsamples them to the network's
+    frame size in a single pass.
+
+    Both steps are linear, so they are folded into two weight tables per input
+    resolution: one averaging input rows into output rows, and one averaging each
+    output column's input columns and color channels at once. A frame is then two
+    matrix products. The tables and working buffers are built the first time a
+    resolution is seen and reused for every later frame of that resolution.
+    """
+
+    def __init__(self, out_shape=(FRAME_HEIGHT, FRAME_WIDTH)):
+        """Initializes the preprocessor.
+
+        Args:
+            out_shape: The (height, width) of the preprocessed frames.
+        """
+        self.out_shape = tuple(out_shape)
+        self.kernels = {}
+
+    def __call__(self, frame, out=None):
+        """Preprocesses a frame.
+
+        Args:
+            frame: The pixel values from the screen, as a height x width x channels (or
+                height x width) array.
+            out (optional): A uint8 array of shape out_shape to write the result into.
+
+        Returns:
+            The preprocessed uint8 frame (out, if given).
+        """
+        if out is None:
+            out = np.empty(self.out_shape, dtype=np.uint8)
+        kernel = self.kernels.get(frame.shape)
+        if kernel is None:
+            kernel = self.kernels[frame.shape] = self.__build_kernel(frame.shape)
+        row_weights, col_weights, pixels, rows, result = kernel
+
+        np.copyto(pixels, frame.reshape(pixels.shape))
+        np.matmul(row_weights, pixels, out=rows)
+        np.matmul(rows, col_weights, out=result)
+        np.add(result, 0.5, out=result)
+        np.copyto(out, result, casting='unsafe')
+        return out
+
+    def __build_kernel(self, in_shape):
+        """Builds the weight tables and working buffers for the given input shape.
+
+        Args:
+            in_shape: The shape of the input frames.
+
+        Returns:
+            The row weights, combined column and channel weights, and buffers for the
+            input pixels, the row-averaged pixels and the result (in that order).
+        """
+        in_height, in_width = in_shape[:2]
+        channels = in_shape[2] if len(in_shape) > 2 else 1
+        out_height, out_width = self.out_shape
+
+        row_weights = _area_weights(in_height, out_height)
+        col_weights = np.repeat(_area_weights(in_width, out_width).T / channels, channels, axis=0)
+        pixels = np.empty((in_height, in_width * channels), dtype=np.float32)
+        rows = np.empty((out_height, in_width * channels), dtype=np.float32)
+        result = np.empty(self.out_shape, dtype=np.float32)
+        return row_weights, np.ascontiguousarray(col_weights), pixels, rows, result
+
+
+def _area_weights(in_size, out_size):
+    """Returns the out_size x in_size matrix that area-resamples a line of pixels.
+
+    Each output pixel covers an equal share of the input line, and its value is the
+    average of the input pixels it covers, weighted by how much of each it covers.
+
+    Args:
+        in_size: The number of input pixels.
+        out_size: The number of output pixels.
+    """
+    scale = in_size / float(out_size)
+    starts = np.arange(out_size)[:, np.newaxis] * scale
+    pixels = np.arange(in_size)[np.newaxis, :]
+    overlap = np.minimum(pixels + 1, starts + scale) - np.maximum(pixels, starts)
+    return (np.maximum(overlap, 0) / scale).astype(np.float32)
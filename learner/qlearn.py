@@ -1,17 +1,23 @@
 """Interfaces for Deep Q-Network."""
-from collections import deque
 import random
 import os
+import threading
 from learner.config import *
+from learner.framestack import FrameStack
+from learner.pipeline import PreprocessPipeline
+from learner.preprocess import FramePreprocessor
 from learner.qnet import QNet
+from learner.replay import ReplayMemory, MemmapReplayMemory, PrioritizedReplayMemory, \
+    CompressedReplayMemory, ReplayShards
+from learner.target_cache import TargetCache
+from learner.updater import AsyncUpdater
 import numpy as np
-from scipy.misc import imresize
 import tensorflow as tf
 
 
 class DeepQLearner(object):
     """Provides wrapper around TensorFlow for Deep Q-Network."""
-    def __init__(self, actions, chk_path=CHK_PATH, save=True, restore=False):
+    def __init__(self, actions, chk_path=CHK_PATH, save=True, restore=False, num_envs=1):
         """Intializes the TensorFlow graph.
 
         Args:
@@ -19,16 +25,69 @@ class DeepQLearner(object):
             chk_path: File path to store saved weights.
             save: If true, will save weights regularly.
             restore: If true, will restore weights right away from chk_path.
+            num_envs: The number of games driven at once. If more than one, the learner
+                must be stepped with step_batch rather than step.
         """
         # Initialize state variables.
         self.actions = actions
-        self.net = QNet(len(actions))
+        self.net = QNet(len(actions), sampler=self.__sample_batches if INPUT_PIPELINE else None)
         self.exploration_rate = EXPLORATION_START_RATE
         self.exploration_reduction = (EXPLORATION_START_RATE - EXPLORATION_END_RATE) \
             / float(FINAL_EXPLORATION_TIME - REPLAY_START_SIZE + 1)
         self.iteration = -1
         self.actions_taken = 0
+        self.updates = 0
         self.repeating_action_rewards = 0
+        self.last_action = None
+        self.afterstate_pending = False
+        self.frame_stack = FrameStack()
+        self.preprocessor = FramePreprocessor()
+        self.proc_frame = np.empty((FRAME_HEIGHT, FRAME_WIDTH), dtype=np.uint8)
+
+        # Store all previous transitions in a ring buffer of uint8 frames. Each
+        # frame is stored once; stacked states are rebuilt when sampled.
+        self.replay_dir = os.path.join(chk_path, REPLAY_DIR)
+        if sum([bool(REPLAY_ON_DISK), bool(REPLAY_COMPRESSION), bool(PRIORITIZED_REPLAY)]) > 1:
+            raise Exception('Replay memory cannot combine on-disk storage, compression '
+                            'and prioritized sampling!')
+        if num_envs > 1:
+            # Each game's transitions go to a shard of their own.
+            if REPLAY_ON_DISK or PRIORITIZED_REPLAY:
+                raise Exception('Replay memory type does not support %d games!' % num_envs)
+            self.replay = ReplayShards(
+                num_envs, make_shard=CompressedReplayMemory if REPLAY_COMPRESSION else ReplayMemory)
+        elif REPLAY_ON_DISK:
+            self.replay = MemmapReplayMemory(self.replay_dir, restore=restore)
+        elif REPLAY_COMPRESSION:
+            self.replay = CompressedReplayMemory()
+        elif PRIORITIZED_REPLAY:
+            self.replay = PrioritizedReplayMemory()
+        else:
+            self.replay = ReplayMemory()
+        self.replay_lock = threading.Lock()
+
+        # Per-game state for step_batch. The first game's frame stack doubles as the
+        # learner's own, for logging.
+        if num_envs > 1:
+            self.env_stacks = [FrameStack() for _ in range(num_envs)]
+            self.env_states = np.empty(
+                (num_envs, FRAME_HEIGHT, FRAME_WIDTH, STATE_FRAMES), dtype=np.float32)
+            self.env_rewards = np.zeros(num_envs, dtype=np.float32)
+            self.env_actions = [None] * num_envs
+            self.update_credit = 0.
+            self.frame_stack = self.env_stacks[0]
+
+        # While the target network is frozen, remember the value bootstrapped from
+        # each replay entry.
+        self.target_cache = TargetCache() if TARGET_NETWORK and not INPUT_PIPELINE else None
+
+        # Optionally preprocess frames and store transitions on a worker thread.
+        self.pipeline = None
+        if PIPELINE_PREPROCESSING:
+            self.pipeline = PreprocessPipeline(self.__process_frame, self.__remember_transition)
+
+        # Optionally run network updates on a background thread.
+        self.updater = AsyncUpdater(self.__update_network) if ASYNC_UPDATES else None
 
         # Handle network save/restore.
         self.chk_path = chk_path
@@ -39,81 +98,69 @@ class DeepQLearner(object):
         # Clear the log.
         open(LOG_PATH, 'w').close()
 
-        # Store all previous transitions in a deque to allow for efficient
-        # popping from the front and to allow for size management.
-        #
-        # Transitions are dictionaries of the form below.
-        #     {
-        #         'state_in': The Q-network input at this point in time.
-        #         'action': The action index (indices) taken at this frame.
-        #         'reward': The reward from this action.
-        #         'terminal': True if the action led to a terminal state.
-        #         'state_out': The state resulting from the given action.
-        #     }
-        self.transitions = deque(maxlen=REPLAY_MEMORY_SIZE)
-
     def __normalize_frame(self, frame):
-        """Normalizes the screen array to be 84x84x1, with floating point values in
-        the range [0, 1].
+        """Resizes the screen array to be 84x84 and pools across color channels.
 
         Args:
             frame: The pixel values from the screen.
 
         Returns:
-            An 84x84x1 floating point numpy array.
+            An 84x84 uint8 numpy array. The array is reused for the next frame.
         """
-        return np.reshape(
-            np.mean(imresize(frame, (FRAME_HEIGHT, FRAME_WIDTH)), axis=2),
-            (FRAME_HEIGHT, FRAME_WIDTH, 1))
+        return self.preprocessor(frame, out=self.proc_frame)
 
     def __preprocess(self, frame):
-        """Resize image, pool across color channels, and normalize pixels.
+        """Resize image, pool across color channels, and push onto the frame stack.
 
         Args:
             frame: The frame to process.
-
-        Returns:
-            The preprocessed frame.
         """
-        proc_frame = self.__normalize_frame(frame)
-        if not len(self.transitions):
-            return np.repeat(proc_frame, STATE_FRAMES, axis=2)
-        else:
-            return np.concatenate(
-                (proc_frame, self.transitions[-1]['state_in'][:, :, -(STATE_FRAMES-1):]),
-                axis=2)
+        self.frame_stack.push(self.__normalize_frame(frame))
 
-    def __remember_transition(self, pre_frame, action, terminal):
-        """Returns the transition dictionary for the given data. Defer recording the
-        reward and resulting state until they are observed.
+    def __remember_transition(self, action, terminal):
+        """Stores the transition for the newest frame. Defer recording the reward
+        until it is observed.
 
         Args:
-            pre_frame: The frame at the current time.
-            action: The index of the action(s) taken at current time.
+            action: The action taken at current time.
             terminal: True if the action at current time led to episode termination.
         """
-        self.transitions.append({
-            'state_in': pre_frame,
-            'action': self.actions.index(action),
-            'terminal': terminal
-        })
+        with self.replay_lock:
+            self.replay.append(
+                self.frame_stack.newest_frame(), self.actions.index(action), terminal)
+
+    def __observe_result(self, reward):
+        """Records the reward from the previous action. The resulting state is the
+        next entry stored in the replay memory.
+
+        Args:
+            reward: The reward from the previous transition.
+        """
+        with self.replay_lock:
+            self.replay.observe_reward(reward)
 
-    def __observe_result(self, resulting_state, reward):
-        """Records the resulting state and reward from the previous action.
-        Clips reward as necessary.
+    def __process_frame(self, frame, reward):
+        """Preprocesses a new frame and records the reward from the previous action.
 
         Args:
-            resulting_state: The (preprocessed) state resulting from the previous action.
+            frame: The new game frame.
             reward: The reward from the previous transition.
         """
-        if not len(self.transitions):
-            return
-        self.transitions[-1]['reward'] = reward
-        self.transitions[-1]['state_out'] = resulting_state
+        self.__preprocess(frame)
+        self.__observe_result(reward)
 
     def __is_burning_in(self):
         """Returns true if the network is still burning in (observing transitions)."""
-        return len(self.transitions) < REPLAY_START_SIZE
+        return len(self.replay) < REPLAY_START_SIZE
+
+    def __sample_batches(self):
+        """Yields replay minibatches forever, for the network's input pipeline. The
+        replay memory reuses its minibatch arrays, so each batch is copied.
+        """
+        while True:
+            with self.replay_lock:
+                batch = tuple(np.copy(array) for array in self.replay.sample(BATCH_SIZE))
+            yield batch
 
     def do_explore(self):
         """Returns true if a random action should be taken, false otherwise.
@@ -126,31 +173,61 @@ class DeepQLearner(object):
                 EXPLORATION_END_RATE)
         return random.random() < self.exploration_rate or self.__is_burning_in()
 
-    def __best_action(self, frame):
-        """Returns the best action to perform.
-
-        Args:
-            frame: The current (preprocessed) frame.
-        """
-        return self.actions[np.argmax(self.net.compute_q(frame))]
+    def __best_action(self):
+        """Returns the best action to perform in the current state."""
+        return self.actions[np.argmax(self.net.compute_q(self.frame_stack.state()))]
 
     def __random_action(self):
         """Returns a random action to perform."""
         return self.actions[int(random.random() * len(self.actions))]
 
-    def __compute_target_reward(self, trans):
-        """Computes the target reward for the given transition.
+    def __compute_target_rewards(self, returns, dones, states_out, serials):
+        """Computes the target rewards for a minibatch of transitions with a single
+        forward pass over their resulting states. Values cached since the last target
+        network sync are reused rather than recomputed.
 
         Args:
-            trans: The transition for which to compute the target reward.
+            returns: Array of the n-step returns observed for the transitions.
+            dones: Array of flags, true where the episode ended within those n steps.
+            states_out: Array of the states n steps after the transitions.
+            serials: Array of the transitions' replay serials.
 
         Returns:
-            The target reward.
+            The array of target rewards.
         """
-        target_reward = trans['reward']
-        if not trans['terminal']:
-            target_reward += DISCOUNT * np.amax(self.net.compute_q(trans['state_out']))
-        return target_reward
+        if self.target_cache is None:
+            future_rewards = np.amax(self.net.compute_target_q_batch(states_out), axis=1)
+        else:
+            future_rewards = np.empty(len(serials), dtype=np.float32)
+            missing = self.target_cache.lookup(serials, future_rewards)
+            if len(missing):
+                future_rewards[missing] = np.amax(
+                    self.net.compute_target_q_batch(states_out[missing]), axis=1)
+                self.target_cache.store(serials[missing], future_rewards[missing])
+        future_rewards[dones] = 0
+        return returns + DISCOUNT ** N_STEP_RETURNS * future_rewards
+
+    def __update_network(self):
+        """Updates the network with a minibatch sampled from the replay memory."""
+        if INPUT_PIPELINE:
+            _, td_errors, batch_serials = self.net.update_from_sampler()
+        else:
+            with self.replay_lock:
+                (batch_frames, batch_actions, batch_returns, batch_states_out, batch_dones,
+                 batch_weights, batch_serials) = self.replay.sample(BATCH_SIZE)
+            batch_targets = self.__compute_target_rewards(
+                batch_returns, batch_dones, batch_states_out, batch_serials)
+            _, td_errors = self.net.update(
+                batch_frames, batch_actions, batch_targets, batch_weights)
+        with self.replay_lock:
+            self.replay.update_priorities(batch_serials, td_errors)
+
+        # Periodically refresh the frozen target network.
+        self.updates += 1
+        if TARGET_NETWORK and self.updates % TARGET_SYNC_FREQUENCY == 0:
+            self.net.sync_target()
+            if self.target_cache is not None:
+                self.target_cache.clear()
 
     def step(self, frame, reward, terminal, score_ratio=None):
         """Steps the training algorithm given the current frame and previous reward.
@@ -166,6 +243,7 @@ class DeepQLearner(object):
             The next action to perform.
         """
         self.iteration += 1
+        self.repeating_action_rewards += reward
 
         # Log if necessary.
         if self.iteration % LOG_FREQUENCY == 0:
@@ -175,45 +253,193 @@ class DeepQLearner(object):
         # If we ARE repeating an action, we pretend that we did not see
         # this frame and just keep doing what we're doing.
         if self.iteration % ACTION_REPEAT != 0:
-            self.repeating_action_rewards += reward
-            return [self.transitions[-1]['action']]
+            return [self.last_action]
 
-        # Observe the previous reward.
-        proc_frame = self.__preprocess(frame)
-        self.__observe_result(proc_frame, self.repeating_action_rewards)
+        # Observe the previous reward. When pipelining, this happens on the worker
+        # thread while the network updates.
+        if self.pipeline:
+            self.pipeline.submit_frame(frame, self.repeating_action_rewards)
+        else:
+            self.__process_frame(frame, self.repeating_action_rewards)
 
         # Save network if necessary before updating.
         if self.save and self.iteration % SAVE_FREQUENCY == 0:
             self.__save()
 
-        # If not burning in, update the network.
-        if not self.__is_burning_in() and self.actions_taken % UPDATE_FREQUENCY == 0:
-            # Update network from the previous action.
-            minibatch = random.sample(self.transitions, BATCH_SIZE)
-            batch_frames = [trans['state_in'] for trans in minibatch]
-            batch_actions = [trans['action'] for trans in minibatch]
-            batch_targets = [self.__compute_target_reward(trans) for trans in minibatch]
-            self.net.update(batch_frames, batch_actions, batch_targets)
+        # If not burning in, update the network (or let the background thread know
+        # another action has been taken).
+        if not self.__is_burning_in():
+            if self.updater:
+                self.updater.record_action()
+            elif self.actions_taken % UPDATE_FREQUENCY == 0:
+                self.__update_network()
+
+        # Wait for the new frame before acting on it.
+        if self.pipeline:
+            self.pipeline.wait()
 
         # Select the next action.
-        action = self.__random_action() if self.do_explore() else self.__best_action(proc_frame)
+        action = self.__random_action() if self.do_explore() else self.__best_action()
         self.actions_taken += 1
+        self.last_action = action
 
         # Remember the action and the input frames, reward to be observed later.
-        self.__remember_transition(proc_frame, action, terminal)
+        if self.pipeline:
+            self.pipeline.submit_transition(action, terminal)
+        else:
+            self.__remember_transition(action, terminal)
 
         # Reset rewards counter for each group of 4 frames.
         self.repeating_action_rewards = 0
 
         return [action]
 
+    def step_batch(self, frames, rewards, terminals, score_ratio=None):
+        """Steps the training algorithm for every game at once. Like step, but the
+        actions of all games are chosen with a single forward pass. Every game must be
+        stepped on every call.
+
+        Args:
+            frames: List of the current frame of each game.
+            rewards: Array of the reward from each game's previous action.
+            terminals: Array of flags, true where a game's previous action was terminal.
+            score_ratio (optional): Ratio between player and adversary's score.
+
+        Returns:
+            The list of next actions to perform, one per game.
+        """
+        self.iteration += 1
+        self.env_rewards += rewards
+
+        # Log if necessary.
+        if self.iteration % LOG_FREQUENCY == 0:
+            self.__log_status(score_ratio)
+
+        # Repeat previous actions for some number of iterations.
+        if self.iteration % ACTION_REPEAT != 0:
+            return [self.actions[action] for action in self.env_actions]
+
+        # Observe the rewards of the previous actions.
+        for stack, frame in zip(self.env_stacks, frames):
+            stack.push(self.__normalize_frame(frame))
+        with self.replay_lock:
+            for env, reward in enumerate(self.env_rewards):
+                self.replay.observe_reward(env, reward)
+
+        # Save network if necessary before updating.
+        if self.save and self.iteration % SAVE_FREQUENCY == 0:
+            self.__save()
+
+        # If not burning in, run the updates earned by the actions of every game.
+        if not self.__is_burning_in():
+            if self.updater:
+                self.updater.record_action(len(frames))
+            else:
+                self.update_credit += len(frames) / float(UPDATE_FREQUENCY)
+                while self.update_credit >= 1:
+                    self.__update_network()
+                    self.update_credit -= 1
+
+        # Select the next actions, evaluating the network once for all games.
+        explore = [self.do_explore() for _ in frames]
+        if not all(explore):
+            for env, stack in enumerate(self.env_stacks):
+                self.env_states[env] = stack.state()
+            best_actions = np.argmax(self.net.compute_q_batch(self.env_states), axis=1)
+        for env in range(len(frames)):
+            self.env_actions[env] = int(random.random() * len(self.actions)) \
+                if explore[env] else int(best_actions[env])
+        self.actions_taken += len(frames)
+
+        # Remember the actions and the input frames, rewards to be observed later.
+        with self.replay_lock:
+            for env, stack in enumerate(self.env_stacks):
+                self.replay.append(
+                    env, stack.newest_frame(), self.env_actions[env], terminals[env])
+        self.env_rewards[:] = 0
+
+        return [self.actions[action] for action in self.env_actions]
+
+    def step_afterstates(self, afterstates, rewards, terminals):
+        """Steps the training algorithm by choosing between the states the game can be
+        left in (afterstates), scoring all of them with a single forward pass. The
+        learner must have been created with a single action, whose Q value is the value
+        of an afterstate: a choice is worth its reward plus the discounted value of its
+        afterstate. Each chosen afterstate is stored as one transition, so one decision
+        is made per call rather than per frame. Since that value is bootstrapped one
+        choice ahead, N_STEP_RETURNS must be 1.
+
+        Like the replay memory, the frame stack runs on across episodes: the first
+        afterstate of a game is stacked on the last ones of the game before.
+
+        Args:
+            afterstates: List of the frames of the afterstates to choose from.
+            rewards: Array of the reward earned by choosing each afterstate.
+            terminals: Array of flags, true where choosing an afterstate ends the episode.
+
+        Returns:
+            The index of the chosen afterstate.
+        """
+        if N_STEP_RETURNS != 1:
+            raise Exception('Afterstates do not support %d-step returns!' % N_STEP_RETURNS)
+        self.iteration += 1
+
+        # Log if necessary.
+        if self.iteration % LOG_FREQUENCY == 0:
+            self.__log_status()
+
+        # Stack each afterstate on the frames of the afterstates chosen before it.
+        states = np.empty(
+            (len(afterstates), FRAME_HEIGHT, FRAME_WIDTH, STATE_FRAMES), dtype=np.float32)
+        history = self.frame_stack.state() if self.frame_stack.newest >= 0 else None
+        for index, frame in enumerate(afterstates):
+            states[index, :, :, 0] = self.__normalize_frame(frame)
+            states[index, :, :, 1:] = history[:, :, :-1] if history is not None \
+                else states[index, :, :, :1]
+
+        # Save network if necessary before updating.
+        if self.save and self.iteration % SAVE_FREQUENCY == 0:
+            self.__save()
+
+        # If not burning in, update the network (or let the background thread know
+        # another action has been taken).
+        if not self.__is_burning_in():
+            if self.updater:
+                self.updater.record_action()
+            elif self.actions_taken % UPDATE_FREQUENCY == 0:
+                self.__update_network()
+
+        # Choose an afterstate, evaluating the network once for all of them.
+        if self.do_explore():
+            choice = int(random.random() * len(afterstates))
+        else:
+            values = self.net.compute_q_batch(states)[:, 0]
+            choice = int(np.argmax(rewards + DISCOUNT * np.where(terminals, 0., values)))
+        self.actions_taken += 1
+
+        # The previous afterstate's transition ends with this choice. An afterstate
+        # that ends the episode has no value, so it is neither stored nor stacked.
+        if self.afterstate_pending:
+            with self.replay_lock:
+                self.replay.append(self.frame_stack.newest_frame(), 0, terminals[choice])
+                self.replay.observe_reward(rewards[choice])
+        self.afterstate_pending = not terminals[choice]
+        if self.afterstate_pending:
+            self.frame_stack.push(states[choice, :, :, 0])
+
+        return choice
+
     def __log_status(self, score_ratio=None):
         """Print the current status of the Q-learner."""
         print('Iteration: %d' % self.iteration)
 
-        if self.__is_burning_in() or len(self.transitions) < REPLAY_MEMORY_SIZE:
+        if self.__is_burning_in() or len(self.replay) < REPLAY_MEMORY_SIZE:
             print('Replay capacity: %d (burn in %s)' %
-                  (len(self.transitions), 'not done' if self.__is_burning_in() else 'done'))
+                  (len(self.replay), 'not done' if self.__is_burning_in() else 'done'))
+
+        if REPLAY_COMPRESSION and not REPLAY_ON_DISK:
+            print('Replay compression: %0.1fx (%d MB)' %
+                  (self.replay.compression_ratio, self.replay.compressed_bytes // 2**20))
 
         if self.exploration_rate > EXPLORATION_END_RATE and not self.__is_burning_in():
             print('Exploration rate: %0.9f (%s annealing)' %
@@ -221,7 +447,7 @@ class DeepQLearner(object):
 
         # If we're using the network, print a sample of the output.
         if not self.__is_burning_in():
-            print('Sample Q output:', self.net.compute_q(self.transitions[-1]['state_in']))
+            print('Sample Q output:', self.net.compute_q(self.frame_stack.state()))
 
         # If the game being played is adversarial, print the score ratio.
         if score_ratio:
@@ -242,6 +468,12 @@ class DeepQLearner(object):
         if not os.path.exists(os.path.dirname(self.chk_path)):
             os.makedirs(os.path.dirname(self.chk_path))
         self.net.saver.save(self.net.sess, self.chk_path, global_step=self.iteration)
+        if EXPORT_WEIGHTS:
+            self.net.export_weights(os.path.join(os.path.dirname(self.chk_path), WEIGHTS_FILE))
+        if SAVE_REPLAY_MEMORY or REPLAY_ON_DISK:
+            with self.replay_lock:
+                self.replay.save(
+                    self.replay_dir, iteration=self.iteration, actions_taken=self.actions_taken)
 
     def __restore(self):
         """Restore the network from the checkpoint path.
@@ -261,3 +493,12 @@ class DeepQLearner(object):
 
         self.net.saver.restore(self.net.sess, model_path)
         print('Network weights, exploration rate, and iteration number restored!')
+
+        if SAVE_REPLAY_MEMORY or REPLAY_ON_DISK:
+            counters = self.replay.load(self.replay_dir)
+            if counters is None:
+                print('No replay memory snapshot found; burning in from scratch.')
+            else:
+                self.iteration = int(counters['iteration']) - 1
+                self.actions_taken = int(counters['actions_taken'])
+                print('Replay memory restored with %d transitions!' % len(self.replay))
@@ -1,6 +1,8 @@
 """Thin wrapper around TensorFlow logic."""
+import os
 from learner.config import *
 import learner.graph as graph
+import numpy as np
 import tensorflow as tf
 
 
@@ -11,26 +13,110 @@ class QNet(object):
     on the number of actions necessary to play a given game.
     """
 
-    def __init__(self, output_width):
+    def __init__(self, output_width, target_network=TARGET_NETWORK, sampler=None,
+                 data_format=DATA_FORMAT, intra_op_threads=INTRA_OP_THREADS,
+                 inter_op_threads=INTER_OP_THREADS):
         """Initializes the TensorFlow graph.
 
         Args:
             output_width: The number of output units.
+            target_network: If true, also build a frozen copy of the network for
+                computing targets, synced by sync_target.
+            sampler (optional): Generator function yielding replay minibatches, in the
+                order returned by ReplayMemory.sample. If given, update_from_sampler
+                trains on minibatches prefetched from it by a tf.data pipeline.
+            data_format: The layout of the convolutional layers, 'NHWC' or 'NCHW'.
+            intra_op_threads: Threads TensorFlow uses within an operation (0 for default).
+            inter_op_threads: Threads TensorFlow uses across operations (0 for default).
         """
-        self.graph_in, self.graph_out = graph.construct_graph(output_width)
+        # When training from the input pipeline, the network inputs default to the
+        # prefetched minibatch. Without a target network, the resulting states go
+        # through the online network in the same pass as the states.
+        batch = self.__input_pipeline(sampler) if sampler is not None else None
+        default_in = None
+        if batch is not None:
+            default_in = batch[0] if target_network else tf.concat([batch[0], batch[3]], 0)
+        self.graph_in, self.graph_out = graph.construct_graph(
+            output_width, default_in, data_format=data_format)
+        self.variables = tf.trainable_variables()
 
-        self.target_reward = tf.placeholder(tf.float32)
-        self.action_idxs = tf.placeholder(tf.int32)
-        actual_reward = tf.gather_nd(self.graph_out, self.action_idxs)
-        self.loss = tf.reduce_mean(
-            tf.square(self.target_reward - actual_reward))
-        self.optimizer = tf.train.AdamOptimizer(LEARNING_RATE).minimize(self.loss)
+        # The target network has its own copy of every variable, which only changes
+        # when the online weights are assigned to it.
+        self.target_in, self.target_out = self.graph_in, self.graph_out
+        self.sync_op = None
+        if target_network:
+            with tf.name_scope(TARGET_SCOPE):
+                self.target_in, self.target_out = graph.construct_graph(
+                    output_width, batch[3] if batch is not None else None,
+                    data_format=data_format)
+            target_variables = tf.get_collection(
+                tf.GraphKeys.TRAINABLE_VARIABLES, scope=TARGET_SCOPE)
+            self.sync_op = tf.group(*[
+                target.assign(online)
+                for online, target in zip(self.variables, target_variables)])
 
-        self.sess = tf.Session()
+        self.target_reward = tf.placeholder(tf.float32, shape=[None])
+        self.taken_actions = tf.placeholder(tf.int32, shape=[None])
+        self.sample_weights = tf.placeholder(tf.float32, shape=[None])
+        adam = tf.train.AdamOptimizer(LEARNING_RATE)
+        self.td_error, self.loss = self.__build_loss(
+            self.graph_out, self.taken_actions, self.target_reward, self.sample_weights)
+        self.optimizer = adam.minimize(self.loss, var_list=self.variables)
+
+        # The input pipeline computes its targets in the graph as well.
+        if batch is not None:
+            states, actions, returns, next_states, dones, weights, self.sampled_serials = batch
+            batch_size = tf.shape(actions)[0]
+            next_q = self.target_out if target_network else self.graph_out[batch_size:]
+            future_rewards = tf.where(
+                dones, tf.zeros_like(returns), tf.reduce_max(next_q, axis=1))
+            targets = tf.stop_gradient(returns + DISCOUNT ** N_STEP_RETURNS * future_rewards)
+            self.sampled_td_error, self.sampled_loss = self.__build_loss(
+                self.graph_out[:batch_size], actions, targets, weights)
+            self.sampled_optimizer = adam.minimize(self.sampled_loss, var_list=self.variables)
+
+        self.sess = tf.Session(config=tf.ConfigProto(
+            intra_op_parallelism_threads=intra_op_threads,
+            inter_op_parallelism_threads=inter_op_threads))
         self.sess.run(tf.global_variables_initializer())
+        self.sync_target()
 
         self.saver = tf.train.Saver()
 
+    def __build_loss(self, q_values, actions, targets, weights):
+        """Builds the importance-weighted squared TD error of a batch.
+
+        Args:
+            q_values: NxA tensor of predicted Q values.
+            actions: Tensor of the N action indices taken.
+            targets: Tensor of the N target Q values.
+            weights: Tensor of the N importance-sampling weights.
+
+        Returns:
+            The TD error and loss tensors (in that order).
+        """
+        # Pair each action with its row in the batch, since q_values is a 2D tensor.
+        action_idxs = tf.stack([tf.range(tf.shape(actions)[0]), actions], axis=1)
+        td_error = targets - tf.gather_nd(q_values, action_idxs)
+        return td_error, tf.reduce_mean(weights * tf.square(td_error))
+
+    def __input_pipeline(self, sampler):
+        """Builds a tf.data pipeline that prefetches minibatches from the sampler.
+
+        Args:
+            sampler: Generator function yielding replay minibatches.
+
+        Returns:
+            The tuple of tensors holding the next minibatch.
+        """
+        state_shape = [None, FRAME_HEIGHT, FRAME_WIDTH, STATE_FRAMES]
+        dataset = tf.data.Dataset.from_generator(
+            sampler,
+            (tf.float32, tf.int32, tf.float32, tf.float32, tf.bool, tf.float32, tf.int64),
+            (state_shape, [None], [None], state_shape, [None], [None], [None]))
+        dataset = dataset.prefetch(INPUT_PREFETCH)
+        return dataset.make_one_shot_iterator().get_next()
+
     def __del__(self):
         """Closes the TensorFlow session, freeing resources."""
         self.sess.close()
@@ -46,19 +132,79 @@ class QNet(object):
         """
         return self.sess.run(self.graph_out, feed_dict={self.graph_in:[net_in]})[0]
 
-    def update(self, batch_frames, batch_actions, batch_targets):
+    def compute_q_batch(self, batch_in):
+        """Forward-propagates a batch of inputs in a single pass.
+
+        Args:
+            batch_in: Nx84x84x4 array of network inputs.
+
+        Returns:
+            The NxA array of network outputs, where A is the output width.
+        """
+        return self.sess.run(self.graph_out, feed_dict={self.graph_in:batch_in})
+
+    def compute_target_q_batch(self, batch_in):
+        """Forward-propagates a batch of inputs through the target network. Without a
+        target network, this is the same as compute_q_batch.
+
+        Args:
+            batch_in: Nx84x84x4 array of network inputs.
+
+        Returns:
+            The NxA array of target network outputs, where A is the output width.
+        """
+        return self.sess.run(self.target_out, feed_dict={self.target_in:batch_in})
+
+    def sync_target(self):
+        """Copies the online network's weights to the target network, if there is one."""
+        if self.sync_op is not None:
+            self.sess.run(self.sync_op)
+
+    def export_weights(self, path):
+        """Writes the online network's weights to an .npz file, keyed by variable name,
+        for use by NumpyQNet. The file is replaced atomically, so readers never see a
+        partial write.
+
+        Args:
+            path: Path of the file to write.
+        """
+        values = self.sess.run(self.variables)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **{variable.op.name: value
+                              for variable, value in zip(self.variables, values)})
+        os.replace(tmp_path, path)
+
+    def update(self, batch_frames, batch_actions, batch_targets, batch_weights=None):
         """Updates the network with the given batch input/target values using RMSProp.
 
         Args:
             batch_frames: Set of Nx84x84x4 network inputs, where N is the batch size.
             batch_actions: Set of N action indices, representing action taken at each state.
             batch_target: Corresponding target Q values for each input.
+            batch_weights (optional): Importance-sampling weight of each input's loss.
+
+        Returns:
+            The loss and the array of TD errors (target minus predicted Q value).
         """
-        # Note: Action indicies must actually be tuples since graph_out is a 2D tensor.
-        # To prevent tight coupling, modify the batch_actions list here.
+        if batch_weights is None:
+            batch_weights = np.ones(len(batch_targets), dtype=np.float32)
+
         return self.sess.run(
-            [self.optimizer, self.loss],
+            [self.optimizer, self.loss, self.td_error],
             feed_dict={
                 self.graph_in:batch_frames,
-                self.action_idxs:[tup for tup in enumerate(batch_actions)],
-                self.target_reward:batch_targets})[1]
+                self.taken_actions:batch_actions,
+                self.target_reward:batch_targets,
+                self.sample_weights:batch_weights})[1:]
+
+    def update_from_sampler(self):
+        """Updates the network with the next minibatch prefetched from the sampler. See
+        update.
+
+        Returns:
+            The loss, the array of TD errors and the array of replay serials of the
+            minibatch.
+        """
+        return self.sess.run(
+            [self.sampled_optimizer, self.sampled_loss, self.sampled_td_error,
+             self.sampled_serials])[1:]
@@ -0,0 +1,790 @@
+"""Replay memory that stores each observed frame exactly once."""
+import lzma
+import os
+import zlib
+from learner.config import *
+from learner.sumtree import SumTree
+import numpy as np
+
+
+class ReplayMemory(object):
+    """A fixed-capacity ring buffer of transitions backed by preallocated arrays.
+
+    Each slot holds the single frame that was newest when an action was chosen, along
+    with that action, the return it earned and its terminal flag. Stacked network
+    states are rebuilt from neighbouring slots when they are needed, so a frame is
+    stored once rather than once per state (and again per resulting state) it is in.
+
+    Returns are n-step: the discounted sum of the rewards of an entry and the n - 1
+    entries after it, cut short at the end of an episode. They are accumulated as
+    rewards are observed, so sampling never has to sum them. An entry is done if its
+    episode ended within those n steps, in which case its return must not be
+    bootstrapped from its resulting state (the state n entries later).
+
+    Entries are addressed by their serial number, i.e. the number of entries appended
+    before them. Serial s lives in slot s % capacity.
+    """
+
+    SNAPSHOT_FILE = 'replay.npz'
+
+    def __init__(self, capacity=REPLAY_MEMORY_SIZE, frame_shape=(FRAME_HEIGHT, FRAME_WIDTH),
+                 history=STATE_FRAMES, n_step=N_STEP_RETURNS, discount=DISCOUNT):
+        """Preallocates the replay arrays.
+
+        Args:
+            capacity: Maximum number of transitions to hold.
+            frame_shape: The (height, width) of a single preprocessed frame.
+            history: The number of frames stacked into one state.
+            n_step: The number of rewards summed into each entry's return.
+            discount: The per-step discount applied to those rewards.
+        """
+        self.capacity = capacity
+        self.frame_shape = tuple(frame_shape)
+        self.history = history
+        self.n_step = n_step
+        self.discounts = (discount ** np.arange(n_step)).astype(np.float32)
+        self.count = 0
+
+        # Serial of the oldest entry whose return is still accumulating rewards.
+        self.open_serial = 0
+
+        self.frames = self._allocate_frames((capacity,) + self.frame_shape)
+        self.actions = np.zeros(capacity, dtype=np.int32)
+        self.returns = np.zeros(capacity, dtype=np.float32)
+        self.terminals = np.zeros(capacity, dtype=np.bool_)
+        self.dones = np.zeros(capacity, dtype=np.bool_)
+
+        # Minibatch arrays, reused by every call to sample.
+        self.batch_size = None
+        self.__allocate_batch(BATCH_SIZE)
+
+    def __allocate_batch(self, batch_size):
+        """Preallocates the arrays that sampled minibatches are gathered into.
+
+        Args:
+            batch_size: The number of transitions per minibatch.
+        """
+        self.batch_size = batch_size
+        # Offsets, relative to an entry, of the frames in its window: the resulting
+        # state's frames followed by the state's own. When the two states overlap,
+        # the shared frames appear once.
+        self.state_start = min(self.n_step, self.history)
+        self.window_offsets = np.concatenate((
+            self.n_step - np.arange(self.state_start),
+            -np.arange(self.history)))
+        self.batch_windows = np.empty(
+            (batch_size, len(self.window_offsets)) + self.frame_shape, dtype=np.uint8)
+        self.batch_states = np.empty(
+            (batch_size,) + self.frame_shape + (self.history,), dtype=np.float32)
+        self.batch_next_states = np.empty_like(self.batch_states)
+        self.batch_actions = np.empty(batch_size, dtype=np.int32)
+        self.batch_returns = np.empty(batch_size, dtype=np.float32)
+        self.batch_dones = np.empty(batch_size, dtype=np.bool_)
+        self.batch_weights = np.ones(batch_size, dtype=np.float32)
+
+    def _allocate_frames(self, shape):
+        """Returns the uint8 array in which frames are stored.
+
+        Args:
+            shape: The shape of the array.
+        """
+        return np.zeros(shape, dtype=np.uint8)
+
+    def _write_frame(self, slot, frame):
+        """Stores a frame in the given slot.
+
+        Args:
+            slot: The slot to write.
+            frame: The preprocessed frame.
+        """
+        self.frames[slot] = frame
+
+    def _read_frames(self, slots, out):
+        """Reads the frames in the given slots.
+
+        Args:
+            slots: Array of slots, of any shape.
+            out: uint8 array of shape slots.shape + frame_shape to read the frames into.
+        """
+        np.take(self.frames, slots, axis=0, out=out)
+
+    def __len__(self):
+        """Returns the number of transitions currently held."""
+        return min(self.count, self.capacity)
+
+    def append(self, frame, action, terminal):
+        """Stores a new transition. Its reward is recorded later by observe_reward.
+
+        Args:
+            frame: The newest (preprocessed) frame of the state the action was chosen in.
+            action: The index of the action taken.
+            terminal: True if the action led to episode termination.
+        """
+        slot = self.count % self.capacity
+        self._write_frame(slot, frame)
+        self.actions[slot] = action
+        self.returns[slot] = 0
+        self.terminals[slot] = terminal
+        self.dones[slot] = False
+        self.count += 1
+
+    def observe_reward(self, reward):
+        """Records the reward earned by the most recent transition, adding it (suitably
+        discounted) to the returns of the entries whose n steps it falls within.
+
+        Args:
+            reward: The reward from the most recent transition.
+        """
+        if not self.count:
+            return
+        newest = self.count - 1
+        oldest = max(self.open_serial, newest - self.n_step + 1, self.count - self.capacity)
+        slots = (newest - np.arange(newest - oldest + 1)) % self.capacity
+        self.returns[slots] += self.discounts[:len(slots)] * reward
+
+        # The episode ended here, so no return before this point sees later rewards.
+        if self.terminals[newest % self.capacity]:
+            self.dones[slots] = True
+            self.open_serial = self.count
+
+    def state(self, serial):
+        """Rebuilds the stacked state for the given entry, newest frame first.
+
+        Args:
+            serial: The serial number of the entry.
+
+        Returns:
+            A height x width x history uint8 array.
+        """
+        serials = np.maximum(serial - np.arange(self.history), 0)
+        frames = np.empty((self.history,) + self.frame_shape, dtype=np.uint8)
+        self._read_frames(serials % self.capacity, frames)
+        return np.moveaxis(frames, 0, -1)
+
+    def sample_range(self):
+        """Returns the [low, high) range of serials that can be sampled.
+
+        The newest n entries are excluded because their resulting states have not been
+        stored yet, and the oldest entries are excluded once their full frame history is
+        no longer in the buffer.
+        """
+        low = max(self.count - self.capacity + self.history - 1, 0)
+        return low, max(self.count - self.n_step, low)
+
+    def sample(self, batch_size):
+        """Samples a uniformly random minibatch of transitions.
+
+        Args:
+            batch_size: The number of transitions to sample.
+
+        Returns:
+            Arrays of states, action indices, n-step returns, resulting states, done flags,
+            importance-sampling weights and entry serials (in that order), each with
+            batch_size entries. Uniform sampling weighs every entry equally. The arrays
+            are reused by the next call, so copy them if they must outlive it.
+        """
+        low, high = self.sample_range()
+        serials = np.random.randint(low, high, size=batch_size)
+        return self._gather(serials) + (self.batch_weights, serials)
+
+    def _gather(self, serials, out=None):
+        """Gathers the states, action indices, returns, resulting states and done flags
+        of the given entries into the preallocated minibatch arrays.
+
+        Args:
+            serials: Array of entry serials.
+            out (optional): Tuple of arrays, in the order listed above, to gather into
+                instead of the preallocated ones.
+
+        Returns:
+            The minibatch arrays, in the order listed above.
+        """
+        count = len(serials)
+        if out is None:
+            if count != self.batch_size:
+                self.__allocate_batch(count)
+            out = (self.batch_states, self.batch_actions, self.batch_returns,
+                   self.batch_next_states, self.batch_dones)
+        elif count > len(self.batch_windows):
+            self.__allocate_batch(count)
+        states, actions, returns, next_states, dones = out
+
+        # Gather every frame needed by the batch with a single fancy index.
+        windows = self.batch_windows[:count]
+        window_serials = np.maximum(serials[:, np.newaxis] + self.window_offsets, 0)
+        self._read_frames(window_serials % self.capacity, windows)
+
+        # Copying one channel at a time keeps reads contiguous, which is much faster
+        # than a single copy through a transposed view.
+        for age in range(self.history):
+            next_states[..., age] = windows[:, age]
+            states[..., age] = windows[:, self.state_start + age]
+
+        slots = serials % self.capacity
+        np.take(self.actions, slots, out=actions)
+        np.take(self.returns, slots, out=returns)
+        np.take(self.dones, slots, out=dones)
+        return out
+
+    def update_priorities(self, serials, td_errors):
+        """Updates sampling priorities from the TD errors of a minibatch. Uniform
+        sampling has no priorities, so this does nothing.
+
+        Args:
+            serials: Array of entry serials, as returned by sample.
+            td_errors: Array of TD errors for those entries.
+        """
+        pass
+
+    def _snapshot(self):
+        """Returns a dictionary of the arrays needed to restore this memory."""
+        return {
+            'frames': self.frames[:len(self)],
+            'actions': self.actions,
+            'returns': self.returns,
+            'terminals': self.terminals,
+            'dones': self.dones,
+            'count': self.count
+        }
+
+    def _restore_snapshot(self, snapshot):
+        """Restores this memory from a snapshot written by save().
+
+        Args:
+            snapshot: Mapping of the arrays returned by _snapshot.
+        """
+        if 'frames' in snapshot:
+            frames = snapshot['frames']
+            self.frames[:len(frames)] = frames
+        self.actions[:] = snapshot['actions']
+        self.returns[:] = snapshot['returns']
+        self.terminals[:] = snapshot['terminals']
+        self.dones[:] = snapshot['dones']
+        self.count = int(snapshot['count'])
+
+        # The next frame observed is not the true result of the newest transition,
+        # so end the episode there and never bootstrap across the gap.
+        if self.count:
+            open_slots = np.arange(max(self.count - self.n_step, 0), self.count) % self.capacity
+            self.terminals[(self.count - 1) % self.capacity] = True
+            self.dones[open_slots] = True
+        self.open_serial = self.count
+
+    def save(self, directory, **extras):
+        """Writes a snapshot of the memory to the given directory.
+
+        Args:
+            directory: Directory in which to write the snapshot.
+            extras: Additional scalars or arrays to store alongside the snapshot.
+        """
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        path = os.path.join(directory, self.SNAPSHOT_FILE)
+        tmp_path = path + '.tmp.npz'
+        snapshot = self._snapshot()
+        snapshot.update(extras)
+        np.savez_compressed(tmp_path, **snapshot)
+        os.replace(tmp_path, path)
+
+    def load(self, directory):
+        """Restores the memory from the snapshot in the given directory.
+
+        Args:
+            directory: Directory holding the snapshot.
+
+        Returns:
+            Dictionary of the extras stored with the snapshot, or None if there is no
+            snapshot in the directory.
+        """
+        path = os.path.join(directory, self.SNAPSHOT_FILE)
+        if not os.path.exists(path):
+            return None
+        snapshot = np.load(path)
+        self._restore_snapshot(snapshot)
+        own_keys = self._snapshot().keys()
+        return {key: snapshot[key] for key in snapshot.files if key not in own_keys}
+
+
+class PrioritizedReplayMemory(ReplayMemory):
+    """A replay memory that samples transitions in proportion to their last TD error.
+
+    Priorities are kept in a sum tree indexed by slot. New transitions get the largest
+    priority seen so far so they are sampled at least once; slots that cannot be
+    sampled (the newest n entries and entries whose frame history was overwritten)
+    have priority zero. See Schaul et al., "Prioritized Experience Replay".
+    """
+
+    def __init__(self, capacity=REPLAY_MEMORY_SIZE, frame_shape=(FRAME_HEIGHT, FRAME_WIDTH),
+                 history=STATE_FRAMES, n_step=N_STEP_RETURNS, discount=DISCOUNT,
+                 alpha=PRIORITY_ALPHA, beta=PRIORITY_BETA_START,
+                 beta_steps=PRIORITY_BETA_ANNEAL_TIME):
+        """Preallocates the replay arrays and the priority tree.
+
+        Args:
+            capacity: Maximum number of transitions to hold.
+            frame_shape: The (height, width) of a single preprocessed frame.
+            history: The number of frames stacked into one state.
+            n_step: The number of rewards summed into each entry's return.
+            discount: The per-step discount applied to those rewards.
+            alpha: How strongly priorities skew sampling (0 is uniform).
+            beta: Initial importance-sampling correction exponent.
+            beta_steps: Number of samples over which beta is annealed to 1.
+        """
+        super(PrioritizedReplayMemory, self).__init__(
+            capacity, frame_shape, history, n_step, discount)
+        self.tree = SumTree(capacity)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = (1. - beta) / float(max(beta_steps, 1))
+        self.max_priority = 1.
+
+    def append(self, frame, action, terminal):
+        """Stores a new transition and updates which slots may be sampled. See parent
+        class function.
+        """
+        super(PrioritizedReplayMemory, self).append(frame, action, terminal)
+        low, high = self.sample_range()
+        slots = [(self.count - 1) % self.capacity]
+        priorities = [0.]
+        ready = high - 1
+        if ready >= low:
+            slots.append(ready % self.capacity)
+            priorities.append(self.max_priority)
+        expired = low - 1
+        if expired >= 0:
+            slots.append(expired % self.capacity)
+            priorities.append(0.)
+        self.tree.update(np.array(slots), np.array(priorities))
+
+    def sample(self, batch_size):
+        """Samples a minibatch in proportion to priority. See parent class function."""
+        # Stratify the draws so each minibatch covers the whole priority range.
+        segment = self.tree.total / batch_size
+        values = (np.arange(batch_size) + 1. - np.random.random(batch_size)) * segment
+        slots = self.tree.find(values)
+        newest = self.count - 1
+        serials = newest - (newest - slots) % self.capacity
+
+        batch = self._gather(serials)
+        probabilities = self.tree.get(slots) / self.tree.total
+        weights = (len(self) * probabilities) ** -self.beta
+        np.divide(weights, weights.max(), out=self.batch_weights, casting='unsafe')
+        self.beta = min(1., self.beta + self.beta_increment)
+
+        return batch + (self.batch_weights, serials)
+
+    def update_priorities(self, serials, td_errors):
+        """Sets the priorities of the sampled entries from their TD errors. Entries
+        that have since left the sampleable range are skipped. See parent class function.
+        """
+        valid = serials >= self.sample_range()[0]
+        if not np.any(valid):
+            return
+        priorities = (np.abs(td_errors[valid]) + PRIORITY_EPSILON) ** self.alpha
+        self.tree.update(serials[valid] % self.capacity, priorities)
+        self.max_priority = max(self.max_priority, priorities.max())
+
+    def _snapshot(self):
+        """Adds the priorities to the snapshot. See parent class function."""
+        snapshot = super(PrioritizedReplayMemory, self)._snapshot()
+        snapshot['priorities'] = self.tree.get(np.arange(self.capacity))
+        snapshot['max_priority'] = self.max_priority
+        snapshot['beta'] = self.beta
+        return snapshot
+
+    def _restore_snapshot(self, snapshot):
+        """Restores the priorities from the snapshot. See parent class function."""
+        super(PrioritizedReplayMemory, self)._restore_snapshot(snapshot)
+        self.tree.update(np.arange(self.capacity), snapshot['priorities'])
+        self.max_priority = float(snapshot['max_priority'])
+        self.beta = float(snapshot['beta'])
+
+
+class MemmapReplayMemory(ReplayMemory):
+    """A replay memory whose arrays live in memory-mapped files on disk.
+
+    The frames, the action, return and flag arrays and the entry count are all mapped,
+    so the files always agree with each other, even if the process dies between saves;
+    the page cache decides what stays resident. Saving flushes the files and writes the
+    extras, so the same files can be reopened after a restart. Restoring drops the
+    entries appended since the last save, so the memory matches the extras saved with it.
+    """
+
+    FRAMES_FILE = 'frames.dat'
+    ARRAY_FILES = {
+        'actions': ('actions.dat', np.int32),
+        'returns': ('returns.dat', np.float32),
+        'terminals': ('terminals.dat', np.bool_),
+        'dones': ('dones.dat', np.bool_)
+    }
+    COUNT_FILE = 'count.dat'
+
+    def __init__(self, directory, capacity=REPLAY_MEMORY_SIZE,
+                 frame_shape=(FRAME_HEIGHT, FRAME_WIDTH), history=STATE_FRAMES,
+                 n_step=N_STEP_RETURNS, discount=DISCOUNT, restore=False):
+        """Opens (or creates) the memory-mapped files.
+
+        Args:
+            directory: Directory holding the replay files.
+            capacity: Maximum number of transitions to hold.
+            frame_shape: The (height, width) of a single preprocessed frame.
+            history: The number of frames stacked into one state.
+            n_step: The number of rewards summed into each entry's return.
+            discount: The per-step discount applied to those rewards.
+            restore: If true, reopen the existing files rather than creating new ones,
+                if there are any. The memory is then restored with load().
+        """
+        self.directory = directory
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        files = [self.FRAMES_FILE, self.COUNT_FILE] + \
+            [name for name, _ in self.ARRAY_FILES.values()]
+        self.restored = restore and all(
+            os.path.exists(os.path.join(directory, name)) for name in files)
+        super(MemmapReplayMemory, self).__init__(
+            capacity, frame_shape, history, n_step, discount)
+        for attribute, (name, dtype) in self.ARRAY_FILES.items():
+            setattr(self, attribute, self.__map(name, dtype, (capacity,)))
+        self.counter = self.__map(self.COUNT_FILE, np.int64, (1,))
+
+        # Serial of the oldest entry that survived the last restore.
+        self.first_serial = 0
+
+    def __map(self, name, dtype, shape):
+        """Maps one of the replay files, reopening it when restoring.
+
+        Args:
+            name: The file name, within the replay directory.
+            dtype: The data type of the array.
+            shape: The shape of the array.
+        """
+        path = os.path.join(self.directory, name)
+        if not self.restored:
+            return np.memmap(path, dtype=dtype, mode='w+', shape=shape)
+        if os.path.getsize(path) != np.prod(shape) * np.dtype(dtype).itemsize:
+            raise Exception('Replay memory at %s does not match shape %s!' % (path, shape))
+        return np.memmap(path, dtype=dtype, mode='r+', shape=shape)
+
+    def _allocate_frames(self, shape):
+        """Maps the frames file. See parent class function."""
+        return self.__map(self.FRAMES_FILE, np.uint8, shape)
+
+    def __len__(self):
+        """Leaves out the entries lost on restore. See parent class function."""
+        return self.count - max(self.count - self.capacity, self.first_serial)
+
+    def append(self, frame, action, terminal):
+        """Stores a new transition, then counts it on disk. See parent class function."""
+        super(MemmapReplayMemory, self).append(frame, action, terminal)
+        self.counter[0] = self.count
+
+    def sample_range(self):
+        """Leaves out the entries lost on restore. See parent class function."""
+        low, high = super(MemmapReplayMemory, self).sample_range()
+        if self.first_serial:
+            low = max(low, self.first_serial + self.history - 1)
+        return low, max(high, low)
+
+    def _snapshot(self):
+        """Leaves the arrays out of the snapshot, since they are already on disk. See
+        parent class function.
+        """
+        return {'count': self.count, 'first_serial': self.first_serial}
+
+    def _restore_snapshot(self, snapshot):
+        """Restores the memory from the mapped files, truncated to the count saved in
+        the snapshot. See parent class function.
+        """
+        mapped = {attribute: getattr(self, attribute) for attribute in self.ARRAY_FILES}
+        mapped['count'] = count = int(snapshot['count'])
+        super(MemmapReplayMemory, self)._restore_snapshot(mapped)
+
+        # Each entry appended since the snapshot overwrote the one a capacity before it,
+        # so those are lost too.
+        newest = int(self.counter[0])
+        self.first_serial = min(max(int(snapshot['first_serial']), newest - self.capacity), count)
+        self.counter[0] = count
+
+    def save(self, directory, **extras):
+        """Flushes the mapped files and writes the snapshot. See parent class function."""
+        for array in [self.frames, self.counter] + \
+                [getattr(self, attribute) for attribute in self.ARRAY_FILES]:
+            array.flush()
+        super(MemmapReplayMemory, self).save(directory, **extras)
+
+    def load(self, directory):
+        """Restores the memory from the files reopened on construction. See parent class
+        function.
+
+        Returns:
+            Dictionary of the extras stored with the last snapshot, or None if no files
+            were reopened or the memory was never saved (in which case it is emptied).
+        """
+        path = os.path.join(directory, self.SNAPSHOT_FILE)
+        if not self.restored or not os.path.exists(path):
+            self.counter[0] = 0
+            return None
+        return super(MemmapReplayMemory, self).load(directory)
+
+
+class CompressedReplayMemory(ReplayMemory):
+    """A replay memory that stores each frame compressed.
+
+    Game frames are mostly flat color, so they compress well. Frames are compressed
+    once when stored and only the frames of sampled transitions are decompressed, each
+    at most once per minibatch. Run-length encoded frames of a whole minibatch are
+    decoded with a single vectorized pass.
+    """
+
+    def __init__(self, capacity=REPLAY_MEMORY_SIZE, frame_shape=(FRAME_HEIGHT, FRAME_WIDTH),
+                 history=STATE_FRAMES, n_step=N_STEP_RETURNS, discount=DISCOUNT,
+                 codec=REPLAY_COMPRESSION):
+        """Initializes an empty compressed memory.
+
+        Args:
+            capacity: Maximum number of transitions to hold.
+            frame_shape: The (height, width) of a single preprocessed frame.
+            history: The number of frames stacked into one state.
+            n_step: The number of rewards summed into each entry's return.
+            discount: The per-step discount applied to those rewards.
+            codec: One of 'zlib', 'lzma' or 'rle'.
+        """
+        if codec not in _CODECS:
+            raise Exception('Unknown replay compression %s!' % codec)
+        if codec == 'rle' and np.prod(frame_shape) > np.iinfo(np.uint16).max:
+            raise Exception('Frames of shape %s are too large to run-length encode!'
+                            % (frame_shape,))
+        self.codec = codec
+        self.compressed_bytes = 0
+        super(CompressedReplayMemory, self).__init__(
+            capacity, frame_shape, history, n_step, discount)
+
+    @property
+    def compression_ratio(self):
+        """The ratio of the raw size of the held frames to their compressed size."""
+        raw_bytes = len(self) * int(np.prod(self.frame_shape))
+        return raw_bytes / float(max(self.compressed_bytes, 1))
+
+    def _allocate_frames(self, shape):
+        """Returns a list of compressed frames, initially empty. See parent class
+        function.
+        """
+        return [b''] * shape[0]
+
+    def _write_frame(self, slot, frame):
+        """Compresses the frame into the given slot. See parent class function."""
+        data = _CODECS[self.codec][0](np.ascontiguousarray(frame, dtype=np.uint8))
+        self.compressed_bytes += len(data) - len(self.frames[slot])
+        self.frames[slot] = data
+
+    def _read_frames(self, slots, out):
+        """Decompresses each distinct frame once, then gathers them. See parent class
+        function.
+        """
+        unique_slots, inverse = np.unique(slots, return_inverse=True)
+        decoded = _CODECS[self.codec][1]([self.frames[slot] for slot in unique_slots])
+        np.take(decoded.reshape((-1,) + self.frame_shape), inverse.reshape(slots.shape),
+                axis=0, out=out)
+
+    def _snapshot(self):
+        """Stores the compressed frames as one byte array plus their sizes. See parent
+        class function.
+        """
+        snapshot = super(CompressedReplayMemory, self)._snapshot()
+        held = self.frames[:len(self)]
+        snapshot['frames'] = np.frombuffer(b''.join(held), dtype=np.uint8)
+        snapshot['frame_sizes'] = np.array([len(data) for data in held], dtype=np.int64)
+        return snapshot
+
+    def _restore_snapshot(self, snapshot):
+        """Splits the stored byte array back into compressed frames. See parent class
+        function.
+        """
+        data = snapshot['frames'].tobytes()
+        ends = np.cumsum(snapshot['frame_sizes'])
+        for slot, (start, end) in enumerate(zip(ends - snapshot['frame_sizes'], ends)):
+            self.frames[slot] = data[start:end]
+        self.compressed_bytes = int(ends[-1]) if len(ends) else 0
+        snapshot = {key: snapshot[key] for key in snapshot.files if key != 'frames'}
+        super(CompressedReplayMemory, self)._restore_snapshot(snapshot)
+
+
+class ReplayShards(object):
+    """A replay memory split into independent shards, one per stream of experience.
+
+    States are rebuilt from consecutive entries, so transitions from different games
+    must not be interleaved in one ring buffer. Each stream appends to its own shard
+    instead, and minibatches are drawn uniformly from the entries of all shards. Entry
+    s of shard i is given the serial s * num_shards + i, so serials stay unique.
+    """
+
+    def __init__(self, num_shards, capacity=REPLAY_MEMORY_SIZE, make_shard=ReplayMemory):
+        """Creates the shards.
+
+        Args:
+            num_shards: The number of shards.
+            capacity: Maximum number of transitions to hold across all shards.
+            make_shard: Function creating a replay memory from its capacity. Sampling is
+                uniform across shards, so the shards should sample uniformly too.
+        """
+        self.shards = [make_shard(capacity // num_shards) for _ in range(num_shards)]
+        self.batch_size = None
+
+    def __allocate_batch(self, batch_size):
+        """Preallocates the arrays that sampled minibatches are gathered into.
+
+        Args:
+            batch_size: The number of transitions per minibatch.
+        """
+        shard = self.shards[0]
+        state_shape = (batch_size,) + shard.frame_shape + (shard.history,)
+        self.batch_size = batch_size
+        self.batch = (
+            np.empty(state_shape, dtype=np.float32),
+            np.empty(batch_size, dtype=np.int32),
+            np.empty(batch_size, dtype=np.float32),
+            np.empty(state_shape, dtype=np.float32),
+            np.empty(batch_size, dtype=np.bool_))
+        self.batch_weights = np.ones(batch_size, dtype=np.float32)
+        self.batch_serials = np.empty(batch_size, dtype=np.int64)
+
+    def __len__(self):
+        """Returns the number of transitions currently held."""
+        return sum(len(shard) for shard in self.shards)
+
+    @property
+    def compressed_bytes(self):
+        """The compressed size of the frames held by all shards, if they compress them."""
+        return sum(shard.compressed_bytes for shard in self.shards)
+
+    @property
+    def compression_ratio(self):
+        """The ratio of the raw size of the frames held by all shards to their compressed
+        size, if they compress them.
+        """
+        raw_bytes = sum(len(shard) * int(np.prod(shard.frame_shape)) for shard in self.shards)
+        return raw_bytes / float(max(self.compressed_bytes, 1))
+
+    def append(self, shard, frame, action, terminal):
+        """Stores a new transition in the given shard. See ReplayMemory.append.
+
+        Args:
+            shard: The index of the shard.
+            frame: The newest (preprocessed) frame of the state the action was chosen in.
+            action: The index of the action taken.
+            terminal: True if the action led to episode termination.
+        """
+        self.shards[shard].append(frame, action, terminal)
+
+    def observe_reward(self, shard, reward):
+        """Records the reward earned by the most recent transition of the given shard.
+        See ReplayMemory.observe_reward.
+
+        Args:
+            shard: The index of the shard.
+            reward: The reward from the most recent transition.
+        """
+        self.shards[shard].observe_reward(reward)
+
+    def sample(self, batch_size):
+        """Samples a uniformly random minibatch of transitions from all shards. See
+        ReplayMemory.sample.
+        """
+        if batch_size != self.batch_size:
+            self.__allocate_batch(batch_size)
+        ranges = np.array([shard.sample_range() for shard in self.shards])
+        sizes = ranges[:, 1] - ranges[:, 0]
+        counts = np.random.multinomial(batch_size, sizes / float(sizes.sum()))
+
+        # Each shard gathers its share straight into a slice of the minibatch.
+        start = 0
+        for index, (shard, count) in enumerate(zip(self.shards, counts)):
+            if not count:
+                continue
+            end = start + count
+            serials = np.random.randint(ranges[index, 0], ranges[index, 1], size=count)
+            shard._gather(serials, out=tuple(array[start:end] for array in self.batch))
+            self.batch_serials[start:end] = serials * len(self.shards) + index
+            start = end
+        return self.batch + (self.batch_weights, self.batch_serials)
+
+    def update_priorities(self, serials, td_errors):
+        """Passes the TD errors of a minibatch on to the shards they were sampled from.
+        See ReplayMemory.update_priorities.
+        """
+        shard_indices = serials % len(self.shards)
+        for index, shard in enumerate(self.shards):
+            sampled = shard_indices == index
+            if np.any(sampled):
+                shard.update_priorities(serials[sampled] // len(self.shards), td_errors[sampled])
+
+    def save(self, directory, **extras):
+        """Writes a snapshot of each shard to its own subdirectory. The extras are
+        stored with the first shard. See ReplayMemory.save.
+        """
+        for index, shard in enumerate(self.shards):
+            shard.save(os.path.join(directory, 'shard_%d' % index), **(extras if not index else {}))
+
+    def load(self, directory):
+        """Restores each shard from its subdirectory. See ReplayMemory.load."""
+        loaded = [shard.load(os.path.join(directory, 'shard_%d' % index))
+                  for index, shard in enumerate(self.shards)]
+        return loaded[0]
+
+
+def _rle_encode(frame):
+    """Run-length encodes a frame as its run lengths (uint16) followed by run values.
+
+    Args:
+        frame: uint8 array of at most 65535 pixels.
+    """
+    pixels = frame.ravel()
+    starts = np.concatenate(([0], np.flatnonzero(pixels[1:] != pixels[:-1]) + 1))
+    lengths = np.diff(np.append(starts, pixels.size)).astype(np.uint16)
+    return lengths.tobytes() + pixels[starts].tobytes()
+
+
+def _rle_decode_batch(encoded):
+    """Decodes run-length encoded frames with a single np.repeat over all their runs.
+
+    Args:
+        encoded: List of frames encoded by _rle_encode.
+
+    Returns:
+        The concatenated pixels of the decoded frames.
+    """
+    lengths, values = [], []
+    for data in encoded:
+        runs = len(data) // 3
+        lengths.append(np.frombuffer(data, dtype=np.uint16, count=runs))
+        values.append(np.frombuffer(data, dtype=np.uint8, offset=2 * runs))
+    return np.repeat(np.concatenate(values), np.concatenate(lengths))
+
+
+def _decode_batch_with(decompress):
+    """Returns a batch decoder that decompresses frames one at a time.
+
+    Args:
+        decompress: Function decompressing the bytes of one frame.
+    """
+    def decode_batch(encoded):
+        return np.frombuffer(b''.join([decompress(data) for data in encoded]), dtype=np.uint8)
+    return decode_batch
+
+
+def _zlib_encode(frame):
+    """Compresses a frame with zlib, favouring speed over size."""
+    return zlib.compress(frame.tobytes(), 1)
+
+
+def _lzma_encode(frame):
+    """Compresses a frame with LZMA, favouring speed over size."""
+    return lzma.compress(frame.tobytes(), preset=0)
+
+
+# Maps each codec name to its frame encoder and its batch decoder.
+_CODECS = {
+    'zlib': (_zlib_encode, _decode_batch_with(zlib.decompress)),
+    'lzma': (_lzma_encode, _decode_batch_with(lzma.decompress)),
+    'rle': (_rle_encode, _rle_decode_batch)
+}
@@ -0,0 +1,71 @@
+"""Array-based sum tree for proportional sampling."""
+import numpy as np
+
+
+class SumTree(object):
+    """A complete binary tree stored in a flat array, where each node holds the sum of
+    its children. Leaves hold non-negative priorities.
+
+    Node 1 is the root and the children of node i are 2i and 2i + 1, so leaf j lives at
+    index leaf_offset + j. Updates and lookups touch one node per level, i.e. they are
+    O(log n), and both are vectorized over arrays of leaves.
+    """
+
+    def __init__(self, capacity):
+        """Allocates a tree with all priorities set to zero.
+
+        Args:
+            capacity: The number of leaves.
+        """
+        self.capacity = capacity
+        self.leaf_offset = 1 << int(np.ceil(np.log2(max(capacity, 2))))
+        self.nodes = np.zeros(2 * self.leaf_offset, dtype=np.float64)
+
+    @property
+    def total(self):
+        """The sum of all priorities."""
+        return self.nodes[1]
+
+    def get(self, leaves):
+        """Returns the priorities of the given leaves.
+
+        Args:
+            leaves: Array of leaf indices.
+        """
+        return self.nodes[np.asarray(leaves) + self.leaf_offset]
+
+    def update(self, leaves, priorities):
+        """Sets the priorities of the given leaves and recomputes their ancestors.
+
+        Args:
+            leaves: Array of leaf indices. If a leaf is repeated, its last priority wins.
+            priorities: Array of new priorities, one per leaf.
+        """
+        nodes = np.asarray(leaves) + self.leaf_offset
+        self.nodes[nodes] = priorities
+        # Every leaf is at the same depth, so each pass moves all nodes up one level.
+        while nodes[0] > 1:
+            nodes = np.unique(nodes // 2)
+            self.nodes[nodes] = self.nodes[2 * nodes] + self.nodes[2 * nodes + 1]
+
+    def find(self, values):
+        """Finds, for each value, the leaf at which the running sum of priorities first
+        reaches it.
+
+        Args:
+            values: Array of values in (0, total].
+
+        Returns:
+            Array of leaf indices. Unless every priority is zero, each found leaf has a
+            positive priority, even when rounding puts a value past the end of a subtree.
+        """
+        values = np.minimum(np.array(values, dtype=np.float64), self.total)
+        nodes = np.ones(len(values), dtype=np.int64)
+        while nodes[0] < self.leaf_offset:
+            left = 2 * nodes
+            left_sums = self.nodes[left]
+            # Never descend into a subtree whose priorities are all zero.
+            go_right = ((values > left_sums) & (self.nodes[left + 1] > 0)) | (left_sums <= 0)
+            values -= np.where(go_right, left_sums, 0)
+            nodes = left + go_right
+        return nodes - self.leaf_offset
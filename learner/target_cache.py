@@ -0,0 +1,65 @@
+"""Least-recently-used cache of target values for replay entries."""
+from collections import OrderedDict
+from learner.config import *
+import numpy as np
+
+
+class TargetCache(object):
+    """Memoizes the bootstrapped value of replay entries while the target network is
+    frozen.
+
+    Values are keyed by replay serial, which is never reused, so an entry that is
+    overwritten in the replay memory can never be served a stale value. The cache must
+    be cleared whenever the target network changes.
+    """
+
+    def __init__(self, capacity=TARGET_CACHE_SIZE):
+        """Initializes an empty cache.
+
+        Args:
+            capacity: Maximum number of values to keep.
+        """
+        self.capacity = capacity
+        self.values = OrderedDict()
+
+    def __len__(self):
+        """Returns the number of cached values."""
+        return len(self.values)
+
+    def lookup(self, serials, out):
+        """Looks up the values of the given entries.
+
+        Args:
+            serials: Array of replay serials.
+            out: Float array to write the cached values into.
+
+        Returns:
+            Array of the positions in serials whose values are not cached.
+        """
+        missing = []
+        for i, serial in enumerate(serials):
+            value = self.values.get(serial)
+            if value is None:
+                missing.append(i)
+            else:
+                self.values.move_to_end(serial)
+                out[i] = value
+        return np.array(missing, dtype=np.int64)
+
+    def store(self, serials, values):
+        """Caches the values of the given entries, evicting the least recently used
+        values if the cache is full.
+
+        Args:
+            serials: Array of replay serials.
+            values: Array of their values.
+        """
+        for serial, value in zip(serials, values):
+            self.values[serial] = value
+            self.values.move_to_end(serial)
+        while len(self.values) > self.capacity:
+            self.values.popitem(last=False)
+
+    def clear(self):
+        """Drops every cached value."""
+        self.values.clear()
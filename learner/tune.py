@@ -0,0 +1,114 @@
+"""Tunes TensorFlow threading and data layout for the current host.
+
+Run with `python3 -m learner.tune`. The chosen settings are written to
+HOST_PROFILE_PATH, which learner/config.py loads on import.
+"""
+import itertools
+import json
+import os
+from learner.benchmark import time_calls
+from learner.config import *
+from learner.qnet import QNet
+import numpy as np
+import tensorflow as tf
+
+
+# Candidate intra-op thread counts: one, half the cores and all of them.
+CORES = os.cpu_count() or 1
+INTRA_OP_CANDIDATES = sorted({1, max(CORES // 2, 1), CORES})
+
+# Candidate inter-op thread counts.
+INTER_OP_CANDIDATES = [1, 2]
+
+# Candidate layouts of the convolutional layers.
+DATA_FORMAT_CANDIDATES = ['NHWC', 'NCHW']
+
+# Minibatch sizes whose update times are reported. The batch size itself is not
+# tuned, since it changes how many samples are replayed per action, i.e. the learning
+# algorithm rather than just its speed.
+BATCH_SIZE_CANDIDATES = sorted({32, 64, 128, BATCH_SIZE})
+
+
+def measure(intra_op_threads, inter_op_threads, data_format, output_width=3):
+    """Times QNet.compute_q and QNet.update with the given settings.
+
+    Args:
+        intra_op_threads: Threads TensorFlow uses within an operation.
+        inter_op_threads: Threads TensorFlow uses across operations.
+        data_format: The layout of the convolutional layers.
+        output_width: The number of network outputs.
+
+    Returns:
+        The mean compute_q time in seconds, and a dict from each candidate batch size
+        to its mean update time in seconds.
+    """
+    with tf.Graph().as_default():
+        net = QNet(output_width, target_network=False, data_format=data_format,
+                   intra_op_threads=intra_op_threads, inter_op_threads=inter_op_threads)
+        state = np.random.rand(FRAME_HEIGHT, FRAME_WIDTH, STATE_FRAMES).astype(np.float32)
+        compute_q = time_calls(lambda: net.compute_q(state))
+
+        updates = {}
+        for batch_size in BATCH_SIZE_CANDIDATES:
+            frames = np.random.rand(
+                batch_size, FRAME_HEIGHT, FRAME_WIDTH, STATE_FRAMES).astype(np.float32)
+            actions = np.random.randint(output_width, size=batch_size)
+            targets = np.random.rand(batch_size).astype(np.float32)
+            updates[batch_size] = time_calls(lambda: net.update(frames, actions, targets))
+        del net
+
+    return compute_q, updates
+
+
+def tune(path=HOST_PROFILE_PATH):
+    """Measures every combination of candidate settings and writes the best to a
+    profile.
+
+    A learner spends UPDATE_FREQUENCY compute_q calls and one update of BATCH_SIZE
+    samples per network update, so the best settings are those completing the most of
+    those cycles per second. The update times of the other candidate batch sizes are
+    recorded in the profile for reference only.
+
+    Args:
+        path: Path of the profile to write.
+
+    Returns:
+        The chosen settings.
+    """
+    results = []
+    for intra, inter, data_format in itertools.product(
+            INTRA_OP_CANDIDATES, INTER_OP_CANDIDATES, DATA_FORMAT_CANDIDATES):
+        try:
+            compute_q, updates = measure(intra, inter, data_format)
+        except (tf.errors.OpError, ValueError) as error:
+            # Not every build supports every layout (e.g. NCHW on some CPUs).
+            print('%s with %d/%d threads is unsupported: %s' % (
+                data_format, intra, inter, error))
+            continue
+        cycle = UPDATE_FREQUENCY * compute_q + updates[BATCH_SIZE]
+        results.append({
+            'INTRA_OP_THREADS': intra,
+            'INTER_OP_THREADS': inter,
+            'DATA_FORMAT': data_format,
+            'compute_q_ms': compute_q * 1000,
+            'update_ms': {str(batch_size): update * 1000
+                          for batch_size, update in updates.items()},
+            'samples_per_second': BATCH_SIZE / cycle})
+        print('%s, %d/%d threads: compute_q %.2f ms, update %s' % (
+            data_format, intra, inter, compute_q * 1000, ', '.join(
+                '%.2f ms (batch %d)' % (updates[batch_size] * 1000, batch_size)
+                for batch_size in BATCH_SIZE_CANDIDATES)))
+
+    if not results:
+        raise Exception('No candidate settings could be measured on this host!')
+
+    best = max(results, key=lambda result: result['samples_per_second'])
+    settings = {key: best[key] for key in (
+        'INTRA_OP_THREADS', 'INTER_OP_THREADS', 'DATA_FORMAT')}
+    with open(path, 'w') as profile:
+        json.dump({'settings': settings, 'results': results}, profile, indent=2)
+    return settings
+
+
+if __name__ == '__main__':
+    print('Wrote %s: %s' % (HOST_PROFILE_PATH, tune()))
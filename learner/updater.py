@@ -0,0 +1,80 @@
+"""Background thread that runs network updates alongside the game loop."""
+import threading
+from learner.config import *
+
+
+class AsyncUpdater(object):
+    """Runs network updates continuously on a worker thread, paced by the actions taken.
+
+    The worker runs one update for every 1 / updates_per_action actions, and idles when
+    it is ahead of that schedule. If it falls more than max_staleness updates behind,
+    record_action blocks the game loop until it catches up, which bounds how stale the
+    policy acting in the game can get.
+    """
+
+    def __init__(self, update, updates_per_action=ASYNC_UPDATES_PER_ACTION,
+                 max_staleness=ASYNC_MAX_STALENESS):
+        """Starts the worker thread.
+
+        Args:
+            update: Function running one network update.
+            updates_per_action: The replay ratio, in network updates per action.
+            max_staleness: How many updates the worker may fall behind schedule.
+        """
+        self.update = update
+        self.updates_per_action = updates_per_action
+        self.max_staleness = max_staleness
+        self.actions = 0
+        self.updates = 0
+        self.error = None
+        self.closed = False
+        self.condition = threading.Condition()
+
+        self.worker = threading.Thread(target=self.__work)
+        self.worker.daemon = True
+        self.worker.start()
+
+    def record_action(self, count=1):
+        """Counts actions taken, blocking while the worker is too far behind schedule.
+        Re-raises any error raised by an update.
+
+        Args:
+            count: The number of actions taken.
+        """
+        with self.condition:
+            self.actions += count
+            self.condition.notify_all()
+            while self.error is None and self.__updates_due() > self.max_staleness:
+                self.condition.wait()
+            if self.error is not None:
+                raise self.error
+
+    def close(self):
+        """Stops the worker thread after its current update."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.worker.join()
+
+    def __updates_due(self):
+        """Returns how many updates the worker is behind schedule."""
+        return self.actions * self.updates_per_action - self.updates
+
+    def __work(self):
+        """Runs updates as they fall due until closed or an update fails."""
+        while True:
+            with self.condition:
+                while not self.closed and self.__updates_due() < 1:
+                    self.condition.wait()
+                if self.closed:
+                    return
+            try:
+                self.update()
+            except Exception as error:
+                with self.condition:
+                    self.error = error
+                    self.condition.notify_all()
+                return
+            with self.condition:
+                self.updates += 1
+                self.condition.notify_all()
@@ -1,8 +1,12 @@
 """Implementation of PyGamePlayer for Half Pong."""
 from pygame.constants import K_DOWN, K_UP, K_UNKNOWN
 from PyGamePlayer.pygame_player import PyGamePlayer
+from games.batch_pong import BatchPongEnv
+from games.half_pong import HalfPongEnv
+from learner.distributed import DistributedLearner
 from learner.qlearn import DeepQLearner
-from learner.config import LOG_FREQUENCY
+from learner.config import LOG_FREQUENCY, NUM_BATCH_GAMES
+import numpy as np
 
 
 ACTIONS = [K_DOWN, K_UNKNOWN, K_UP]
@@ -29,7 +33,6 @@ class HalfPongPlayer(PyGamePlayer):
         """Returns the feedback for the current state of the game. In this case, just returns
         the change in the learner's score. See parent class function.
         """
-        # import must be done here because otherwise importing would cause the game to start playing
         from games.half_pong import hit_count, miss_count
 
         # get the difference in score between this and the last run
@@ -50,4 +53,35 @@ class HalfPongPlayer(PyGamePlayer):
     def start(self):
         super(HalfPongPlayer, self).start()
         import games.half_pong
-    
\ No newline at end of file
+        games.half_pong.main()
+
+
+class DistributedHalfPongPlayer(object):
+    """Trains on headless games of Half Pong played by NUM_ACTORS actor processes."""
+
+    def start(self):
+        """Starts the actors and the learner, and trains until interrupted."""
+        learner = DistributedLearner(HalfPongEnv, ACTIONS)
+        try:
+            learner.run()
+        finally:
+            learner.close()
+
+
+class BatchHalfPongPlayer(object):
+    """Trains on NUM_BATCH_GAMES headless games of Half Pong, simulated at once by
+    BatchPongEnv.
+    """
+
+    def start(self):
+        """Steps the games and the learner together until interrupted."""
+        games = BatchPongEnv(NUM_BATCH_GAMES, half=True)
+        dql = DeepQLearner(ACTIONS, num_envs=NUM_BATCH_GAMES)
+        frames = games.reset()
+        rewards = np.zeros(NUM_BATCH_GAMES, dtype=np.float32)
+        terminals = np.zeros(NUM_BATCH_GAMES, dtype=np.bool_)
+        while True:
+            # The ratio of hits to misses across all games.
+            score_ratio = float(games.hit_count.sum()) / (games.miss_count.sum() + 1)
+            actions = dql.step_batch(frames, rewards, terminals, score_ratio)
+            frames, rewards, terminals = games.step(actions)
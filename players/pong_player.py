@@ -1,7 +1,12 @@
 """Implementation of PyGamePlayer for Pong."""
 from pygame.constants import K_DOWN, K_UP, K_UNKNOWN
 from PyGamePlayer.pygame_player import PyGamePlayer
+from games.batch_pong import BatchPongEnv
+from games.pong import PongEnv
+from learner.config import NUM_BATCH_GAMES
+from learner.distributed import DistributedLearner
 from learner.qlearn import DeepQLearner
+import numpy as np
 
 
 # The valid actions for pong.
@@ -30,7 +35,6 @@ class PongPlayer(PyGamePlayer):
         the difference in the learner's score minus the difference in the other player's score.
         See parent class function.
         """
-        # Import must be done here because it starts the game.
         from games.pong import bar1_score, bar2_score
 
         # Get the difference in score between this and the last run.
@@ -44,3 +48,31 @@ class PongPlayer(PyGamePlayer):
         """Starts the learner and game."""
         super(PongPlayer, self).start()
         import games.pong
+        games.pong.main()
+
+
+class DistributedPongPlayer(object):
+    """Trains on headless games of Pong played by NUM_ACTORS actor processes."""
+
+    def start(self):
+        """Starts the actors and the learner, and trains until interrupted."""
+        learner = DistributedLearner(PongEnv, ACTIONS)
+        try:
+            learner.run()
+        finally:
+            learner.close()
+
+
+class BatchPongPlayer(object):
+    """Trains on NUM_BATCH_GAMES headless games of Pong, simulated at once by BatchPongEnv."""
+
+    def start(self):
+        """Steps the games and the learner together until interrupted."""
+        games = BatchPongEnv(NUM_BATCH_GAMES)
+        dql = DeepQLearner(ACTIONS, num_envs=NUM_BATCH_GAMES)
+        frames = games.reset()
+        rewards = np.zeros(NUM_BATCH_GAMES, dtype=np.float32)
+        terminals = np.zeros(NUM_BATCH_GAMES, dtype=np.bool_)
+        while True:
+            actions = dql.step_batch(frames, rewards, terminals)
+            frames, rewards, terminals = games.step(actions)
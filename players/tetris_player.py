@@ -8,6 +8,10 @@ from learner.config import *
 
 ACTIONS = [pgc.K_UNKNOWN, pgc.K_RIGHT, pgc.K_LEFT, pgc.K_DOWN, pgc.K_UP]
 
+# In placement mode there is a single action, dropping the piece into a placement, so
+# the network's one output is the value of the board a placement leaves.
+PLACEMENT_ACTIONS = [pgc.K_SPACE]
+
 
 class TetrisPlayer(PyGamePlayer):
     """Implementation of PyGamePlayer for Tetris."""
@@ -65,3 +69,30 @@ class TetrisPlayer(PyGamePlayer):
         """Starts the player."""
         super(TetrisPlayer, self).start()
         games.tetris.main()
+
+
+class TetrisPlacementPlayer(object):
+    """Plays Tetris one placement per piece rather than one keypress per frame.
+
+    For every piece, each final position it can reach is enumerated, and the learner
+    picks one after scoring the resulting boards in a single batched pass. The game runs
+    headless on a simulated clock, as fast as the learner can choose.
+    """
+
+    def __init__(self, display=False, seed=None):
+        """Initializes the game and the deep Q-network.
+
+        Args:
+            display: If true, open a window and draw the game to it.
+            seed (optional): Seed for the random pieces.
+        """
+        self.env = games.tetris.TetrisEnv(display=display, seed=seed)
+        self.dql = DeepQLearner(PLACEMENT_ACTIONS, save=True)
+
+    def start(self):
+        """Plays games forever."""
+        while True:
+            placements = self.env.placements()
+            afterstates, rewards, terminals = self.env.afterstates(placements)
+            choice = self.dql.step_afterstates(afterstates, rewards, terminals)
+            self.env.place(placements[choice])
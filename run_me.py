@@ -6,9 +6,14 @@ from players import pong_player, half_pong_player, flappy_bird_player, tetris_pl
 # in which case we could add the weight file name to the tuples.
 OPTIONS = {
     'p':('Pong', pong_player.PongPlayer),
+    'dp':('Pong (distributed actors)', pong_player.DistributedPongPlayer),
+    'bp':('Pong (batched headless games)', pong_player.BatchPongPlayer),
     'hp':('Half Pong', half_pong_player.HalfPongPlayer),
+    'dhp':('Half Pong (distributed actors)', half_pong_player.DistributedHalfPongPlayer),
+    'bhp':('Half Pong (batched headless games)', half_pong_player.BatchHalfPongPlayer),
     'fb':('Flappy Bird', flappy_bird_player.FlappyBirdPlayer),
-    't':('Tetris', tetris_player.TetrisPlayer)
+    't':('Tetris', tetris_player.TetrisPlayer),
+    'tp':('Tetris (one decision per piece)', tetris_player.TetrisPlacementPlayer)
 }
 
 print(
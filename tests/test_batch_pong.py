@@ -0,0 +1,49 @@
+"""Checks that BatchPongEnv plays the same games as PongEnv and HalfPongEnv."""
+import numpy as np
+import pytest
+
+pytest.importorskip('pygame')
+from pygame.locals import K_DOWN, K_UNKNOWN, K_UP
+from games.batch_pong import BatchPongEnv
+from games.half_pong import HalfPongEnv
+from games.pong import PongEnv
+from learner.preprocess import FramePreprocessor
+
+
+ACTIONS = np.array([K_DOWN, K_UNKNOWN, K_UP])
+NUM_GAMES = 6
+
+
+@pytest.mark.parametrize('half', [False, True])
+def test_games_match_single_envs(half):
+    batch = BatchPongEnv(NUM_GAMES, half=half, seed=0)
+    envs = [HalfPongEnv() if half else PongEnv() for _ in range(NUM_GAMES)]
+    preprocessor = FramePreprocessor(out_shape=batch.frames.shape[1:])
+    if not half:
+        # The batch draws its own serve angles; start each game with the same serve.
+        for env, speed_y in zip(envs, batch.speed_y):
+            env.speed_y = speed_y
+
+    rng = np.random.RandomState(0)
+    points = 0
+    for step in range(1500):
+        # Sometimes follow the ball, so that both hits and misses happen.
+        follow = np.where(batch.circle_y < batch.bar1_y + batch.game.bar_height / 2, K_UP, K_DOWN)
+        actions = np.where(rng.random_sample(NUM_GAMES) < .3, follow,
+                           ACTIONS[rng.randint(len(ACTIONS), size=NUM_GAMES)])
+        frames, rewards, terminals = batch.step(actions)
+        for index, env in enumerate(envs):
+            frame, reward, terminal = env.step(actions[index])
+            assert reward == rewards[index] and terminal == terminals[index], \
+                'game %d differs at step %d' % (index, step)
+            np.testing.assert_array_equal(frames[index], preprocessor(frame))
+            bar_y = env.bar_y if half else env.bar1_y
+            np.testing.assert_allclose([bar_y, env.circle_x, env.circle_y],
+                                       [batch.bar1_y[index], batch.circle_x[index],
+                                        batch.circle_y[index]])
+            if terminal and not half:
+                env.speed_y = batch.speed_y[index]
+        points += np.count_nonzero(terminals)
+    # The games must have gone on long enough to hit the ball and end points.
+    assert points > NUM_GAMES
+    assert (batch.hit_count > 0).all()
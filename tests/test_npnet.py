@@ -0,0 +1,74 @@
+"""Checks NumpyQNet's forward pass against direct loops and the TensorFlow graph."""
+import numpy as np
+import pytest
+from learner.config import FRAME_HEIGHT, FRAME_WIDTH, STATE_FRAMES
+from learner.npnet import NumpyQNet, _conv2d, _pool
+
+
+def reference_window(data, window, stride, fill):
+    """Yields each output position with its SAME-padded input window, using loops."""
+    n, height, width, channels = data.shape
+    out_height, out_width = -(-height // stride), -(-width // stride)
+    top = max((out_height - 1) * stride + window - height, 0) // 2
+    left = max((out_width - 1) * stride + window - width, 0) // 2
+    for y in range(out_height):
+        for x in range(out_width):
+            patch = np.full((n, window, window, channels), fill, dtype=np.float64)
+            for dy in range(window):
+                for dx in range(window):
+                    in_y, in_x = y * stride + dy - top, x * stride + dx - left
+                    if 0 <= in_y < height and 0 <= in_x < width:
+                        patch[:, dy, dx] = data[:, in_y, in_x]
+            yield y, x, patch
+
+
+def reference_conv2d(data, weights, stride):
+    """Convolves with SAME padding one output position at a time."""
+    window, out_channels = weights.shape[0], weights.shape[3]
+    out = np.zeros((len(data), -(-data.shape[1] // stride), -(-data.shape[2] // stride),
+                    out_channels))
+    for y, x, patch in reference_window(data, window, stride, 0.):
+        out[:, y, x] = np.tensordot(patch, weights, axes=3)
+    return out
+
+
+def reference_pool(data, stride=2):
+    """Max-pools with SAME padding one output position at a time."""
+    out = np.zeros((len(data), -(-data.shape[1] // stride), -(-data.shape[2] // stride),
+                    data.shape[3]))
+    for y, x, patch in reference_window(data, stride, stride, -np.inf):
+        out[:, y, x] = patch.max(axis=(1, 2))
+    return out
+
+
+@pytest.mark.parametrize('size,window,stride', [(9, 8, 4), (7, 4, 2), (5, 3, 1), (10, 3, 2)])
+def test_conv2d_matches_loops(size, window, stride):
+    rng = np.random.RandomState(0)
+    data = rng.standard_normal((2, size, size + 1, 3)).astype(np.float32)
+    weights = rng.standard_normal((window, window, 3, 4)).astype(np.float32)
+    np.testing.assert_allclose(_conv2d(data, weights, stride),
+                               reference_conv2d(data, weights, stride), rtol=1e-4, atol=1e-4)
+
+
+@pytest.mark.parametrize('size', [4, 5])
+def test_pool_matches_loops(size):
+    data = np.random.RandomState(1).standard_normal((2, size, size + 1, 3)).astype(np.float32)
+    np.testing.assert_array_equal(_pool(data), reference_pool(data))
+
+
+def test_matches_tensorflow_graph(tmp_path):
+    tf = pytest.importorskip('tensorflow')
+    from learner.qnet import QNet
+
+    tf.reset_default_graph()
+    net = QNet(3, target_network=False)
+    path = str(tmp_path / 'weights.npz')
+    net.export_weights(path)
+
+    batch = np.random.RandomState(2).randint(
+        0, 256, size=(5, FRAME_HEIGHT, FRAME_WIDTH, STATE_FRAMES)).astype(np.float32)
+    numpy_net = NumpyQNet(path)
+    np.testing.assert_allclose(numpy_net.compute_q_batch(batch), net.compute_q_batch(batch),
+                               rtol=1e-4, atol=1e-4)
+    np.testing.assert_allclose(numpy_net.compute_q(batch[0]), net.compute_q(batch[0]),
+                               rtol=1e-4, atol=1e-4)
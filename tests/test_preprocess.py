@@ -0,0 +1,53 @@
+"""Checks the fused preprocessing kernel against a direct area resize."""
+import numpy as np
+from learner.preprocess import FramePreprocessor
+
+
+def reference_resize(frame, out_shape):
+    """Averages the color channels, then averages each output pixel's share of the
+    input pixels, weighted by how much of each it covers.
+    """
+    gray = frame.astype(np.float64)
+    if gray.ndim == 3:
+        gray = gray.mean(axis=2)
+    out = np.empty(out_shape)
+    row_scale = gray.shape[0] / float(out_shape[0])
+    col_scale = gray.shape[1] / float(out_shape[1])
+    for y in range(out_shape[0]):
+        for x in range(out_shape[1]):
+            total = 0.
+            for in_y in range(int(y * row_scale), int(np.ceil((y + 1) * row_scale))):
+                height = min(in_y + 1, (y + 1) * row_scale) - max(in_y, y * row_scale)
+                for in_x in range(int(x * col_scale), int(np.ceil((x + 1) * col_scale))):
+                    width = min(in_x + 1, (x + 1) * col_scale) - max(in_x, x * col_scale)
+                    total += height * width * gray[in_y, in_x]
+            out[y, x] = total / (row_scale * col_scale)
+    return out
+
+
+def test_matches_reference_resize():
+    rng = np.random.RandomState(0)
+    preprocessor = FramePreprocessor(out_shape=(12, 10))
+    for in_shape in [(24, 30, 3), (17, 23, 3), (12, 10, 3), (31, 29)]:
+        frame = rng.randint(0, 256, size=in_shape).astype(np.uint8)
+        result = preprocessor(frame)
+        assert result.shape == (12, 10) and result.dtype == np.uint8
+        # The kernel works in float32, so a value may round the other way at .5.
+        assert np.abs(result - reference_resize(frame, (12, 10))).max() <= .5 + 1e-3
+
+
+def test_preprocessed_frames_pass_through_unchanged():
+    frame = np.random.RandomState(1).randint(0, 256, size=(84, 84)).astype(np.uint8)
+    np.testing.assert_array_equal(FramePreprocessor()(frame), frame)
+
+
+def test_writes_into_out_and_reuses_kernels():
+    preprocessor = FramePreprocessor(out_shape=(4, 4))
+    out = np.empty((4, 4), dtype=np.uint8)
+    frame = np.full((8, 16, 3), 200, dtype=np.uint8)
+    assert preprocessor(frame, out=out) is out
+    assert (out == 200).all()
+    kernel = preprocessor.kernels[frame.shape]
+    preprocessor(np.zeros_like(frame), out=out)
+    assert preprocessor.kernels[frame.shape] is kernel
+    assert (out == 0).all()
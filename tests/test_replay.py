@@ -0,0 +1,114 @@
+"""Checks that the replay memory rebuilds the states it was given."""
+import numpy as np
+from learner.replay import ReplayMemory
+
+
+FRAME_SHAPE = (2, 3)
+
+
+def frame(serial):
+    """Returns a frame whose pixels all hold the given serial (mod 256)."""
+    return np.full(FRAME_SHAPE, serial % 256, dtype=np.uint8)
+
+
+def fill(memory, count):
+    """Appends count transitions whose frames hold their serials, each earning a reward of 1."""
+    for serial in range(count):
+        memory.append(frame(serial), serial % 5, False)
+        memory.observe_reward(1.)
+
+
+def stacked_serials(state):
+    """Returns the serial held by each frame of a state, newest first."""
+    return [int(value) for value in state[0, 0]]
+
+
+def test_frames_are_stored_once_as_uint8():
+    memory = ReplayMemory(capacity=10, frame_shape=FRAME_SHAPE, history=4, n_step=1)
+    assert memory.frames.shape == (10,) + FRAME_SHAPE
+    assert memory.frames.dtype == np.uint8
+
+
+def test_state_stacks_the_newest_frames_first():
+    memory = ReplayMemory(capacity=10, frame_shape=FRAME_SHAPE, history=4, n_step=1)
+    fill(memory, 7)
+    assert memory.state(6).shape == FRAME_SHAPE + (4,)
+    assert stacked_serials(memory.state(6)) == [6, 5, 4, 3]
+    # The first entries repeat the oldest frame rather than reading unwritten slots.
+    assert stacked_serials(memory.state(1)) == [1, 0, 0, 0]
+
+
+def test_sampled_states_after_wrapping():
+    capacity, history = 10, 4
+    memory = ReplayMemory(capacity=capacity, frame_shape=FRAME_SHAPE, history=history, n_step=1)
+    fill(memory, 25)
+    assert len(memory) == capacity
+
+    low, high = memory.sample_range()
+    assert (low, high) == (25 - capacity + history - 1, 24)
+    serials = np.arange(low, high)
+    states, actions, returns, next_states, dones = memory._gather(serials)
+    for index, serial in enumerate(serials):
+        assert stacked_serials(states[index]) == [serial - age for age in range(history)]
+        assert stacked_serials(next_states[index]) == [serial + 1 - age for age in range(history)]
+        assert actions[index] == serial % 5
+        assert returns[index] == 1.
+    assert not dones.any()
+
+
+def test_sample_stays_within_range():
+    memory = ReplayMemory(capacity=10, frame_shape=FRAME_SHAPE, history=4, n_step=1)
+    fill(memory, 25)
+    low, high = memory.sample_range()
+    states, actions, returns, next_states, dones, weights, serials = memory.sample(32)
+    assert ((serials >= low) & (serials < high)).all()
+    for index, serial in enumerate(serials):
+        assert stacked_serials(states[index])[0] == serial
+        assert stacked_serials(next_states[index])[0] == serial + 1
+    assert (weights == 1.).all()
+
+
+def expected_returns(rewards, terminals, n_step, discount):
+    """Computes each entry's n-step return and done flag directly from its rewards."""
+    returns, dones = [], []
+    for serial in range(len(rewards)):
+        total, done = 0., False
+        for step in range(min(n_step, len(rewards) - serial)):
+            total += discount ** step * rewards[serial + step]
+            if terminals[serial + step]:
+                done = True
+                break
+        returns.append(total)
+        dones.append(done)
+    return np.array(returns, dtype=np.float32), np.array(dones)
+
+
+def test_n_step_returns_stop_at_terminals():
+    capacity, n_step, discount = 16, 3, .5
+    memory = ReplayMemory(capacity=capacity, frame_shape=FRAME_SHAPE, history=2,
+                          n_step=n_step, discount=discount)
+    rng = np.random.RandomState(0)
+    rewards = rng.randint(-2, 3, size=50).astype(np.float32)
+    terminals = rng.random_sample(50) < .15
+    for serial in range(50):
+        memory.append(frame(serial), 0, terminals[serial])
+        memory.observe_reward(rewards[serial])
+
+    returns, dones = expected_returns(rewards, terminals, n_step, discount)
+    # Only the entries still held, and whose n rewards have all been observed, are final.
+    serials = np.arange(50 - capacity, 50 - n_step + 1)
+    slots = serials % capacity
+    np.testing.assert_allclose(memory.returns[slots], returns[serials], rtol=1e-6)
+    assert (memory.dones[slots] == dones[serials]).all()
+
+
+def test_n_step_next_state_is_n_entries_later():
+    memory = ReplayMemory(capacity=10, frame_shape=FRAME_SHAPE, history=2, n_step=3)
+    fill(memory, 25)
+    low, high = memory.sample_range()
+    assert high == 25 - 3
+    serials = np.arange(low, high)
+    states, actions, returns, next_states, dones = memory._gather(serials)
+    for index, serial in enumerate(serials):
+        assert stacked_serials(states[index]) == [serial, serial - 1]
+        assert stacked_serials(next_states[index]) == [serial + 3, serial + 2]
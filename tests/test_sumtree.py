@@ -0,0 +1,79 @@
+"""Checks sum-tree lookups and prioritized replay sampling."""
+import numpy as np
+from learner.replay import PrioritizedReplayMemory
+from learner.sumtree import SumTree
+
+
+def cumulative_find(priorities, values):
+    """Finds each value's leaf by a linear scan of the running sums."""
+    sums = np.cumsum(priorities)
+    return np.searchsorted(sums, np.minimum(values, sums[-1]), side='left')
+
+
+def test_find_matches_cumulative_sums():
+    rng = np.random.RandomState(0)
+    for capacity in (1, 2, 5, 16, 37):
+        priorities = rng.random_sample(capacity) * (rng.random_sample(capacity) < .7)
+        priorities[rng.randint(capacity)] += .1
+        tree = SumTree(capacity)
+        tree.update(np.arange(capacity), priorities)
+        assert np.isclose(tree.total, priorities.sum())
+        np.testing.assert_array_equal(tree.get(np.arange(capacity)), priorities)
+
+        values = np.append(rng.random_sample(200) * tree.total, tree.total)
+        values = values[values > 0]
+        found = tree.find(values)
+        np.testing.assert_array_equal(found, cumulative_find(priorities, values))
+        assert (priorities[found] > 0).all()
+
+
+def test_find_never_lands_on_a_zero_leaf():
+    tree = SumTree(4)
+    tree.update(np.arange(4), np.array([.2, 0., .6, 0.]))
+    # Subtracting .2 from the total leaves slightly more than .6, which must not carry
+    # the search past leaf 2 onto the zero leaf after it.
+    np.testing.assert_array_equal(tree.find([.2, .2 + 1e-12, tree.total, tree.total + 1.]),
+                                  [0, 2, 2, 2])
+
+
+def test_update_keeps_the_last_priority_of_a_repeated_leaf():
+    tree = SumTree(8)
+    tree.update(np.array([3, 3, 5]), np.array([1., 2., 4.]))
+    assert tree.total == 6.
+    assert tree.get([3]) == 2.
+
+
+def make_memory(count=40):
+    """Returns a prioritized memory holding count transitions with random TD errors."""
+    memory = PrioritizedReplayMemory(capacity=32, frame_shape=(1, 1), history=2, n_step=1,
+                                     alpha=1., beta=.5, beta_steps=10 ** 9)
+    for serial in range(count):
+        memory.append(np.zeros((1, 1), dtype=np.uint8), 0, False)
+        memory.observe_reward(0.)
+    low, high = memory.sample_range()
+    serials = np.arange(low, high)
+    memory.update_priorities(serials, np.random.RandomState(1).random_sample(len(serials)))
+    return memory, serials
+
+
+def test_sampling_is_proportional_to_priority():
+    np.random.seed(0)
+    memory, serials = make_memory()
+    priorities = memory.tree.get(serials % memory.capacity)
+    draws = 2000
+    sampled = np.concatenate([memory.sample(16)[-1] for _ in range(draws)])
+    # Nothing outside the sampleable range is ever drawn.
+    assert ((sampled >= serials[0]) & (sampled <= serials[-1])).all()
+    frequencies = np.bincount(sampled - serials[0], minlength=len(serials)) / float(len(sampled))
+    np.testing.assert_allclose(frequencies, priorities / priorities.sum(), atol=.005)
+
+
+def test_importance_sampling_weights():
+    np.random.seed(0)
+    memory, serials = make_memory()
+    beta = memory.beta
+    weights, sampled = memory.sample(16)[-2:]
+    probabilities = memory.tree.get(sampled % memory.capacity) / memory.tree.total
+    expected = (len(memory) * probabilities) ** -beta
+    np.testing.assert_allclose(weights, expected / expected.max(), rtol=1e-5)
+    assert memory.beta > beta
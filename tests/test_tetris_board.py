@@ -0,0 +1,112 @@
+"""Checks the Tetris bitboard against the list-of-columns board it replaced."""
+import random
+import pytest
+
+pytest.importorskip('pygame')
+import games.tetris as tetris
+from games.tetris import BLANK, BOARDHEIGHT, BOARDWIDTH, PIECES, TEMPLATEHEIGHT, TEMPLATEWIDTH
+
+
+def list_is_valid_position(board, piece, adjX=0, adjY=0):
+    """The original isValidPosition, on a board of BOARDWIDTH columns of colors."""
+    for x in range(TEMPLATEWIDTH):
+        for y in range(TEMPLATEHEIGHT):
+            boardX, boardY = x + piece['x'] + adjX, y + piece['y'] + adjY
+            if boardY < 0 or PIECES[piece['shape']][piece['rotation']][y][x] == BLANK:
+                continue
+            if not (0 <= boardX < BOARDWIDTH and boardY < BOARDHEIGHT):
+                return False
+            if board[boardX][boardY] != BLANK:
+                return False
+    return True
+
+
+def list_add_to_board(board, piece):
+    """The original addToBoard."""
+    for x in range(TEMPLATEWIDTH):
+        for y in range(TEMPLATEHEIGHT):
+            if PIECES[piece['shape']][piece['rotation']][y][x] != BLANK:
+                board[x + piece['x']][y + piece['y']] = piece['color']
+
+
+def list_remove_complete_lines(board):
+    """The original removeCompleteLines."""
+    numLinesRemoved = 0
+    y = BOARDHEIGHT - 1
+    while y >= 0:
+        if all(board[x][y] != BLANK for x in range(BOARDWIDTH)):
+            for pullDownY in range(y, 0, -1):
+                for x in range(BOARDWIDTH):
+                    board[x][pullDownY] = board[x][pullDownY - 1]
+            for x in range(BOARDWIDTH):
+                board[x][0] = BLANK
+            numLinesRemoved += 1
+        else:
+            y -= 1
+    return numLinesRemoved
+
+
+def assert_boards_match(board, listBoard):
+    """Checks that a bitboard holds the same boxes and colors as a list board."""
+    for y in range(BOARDHEIGHT):
+        colors = [listBoard[x][y] for x in range(BOARDWIDTH)]
+        assert board['colors'][y] == colors
+        bits = sum(1 << (x + tetris.WALLWIDTH) for x in range(BOARDWIDTH) if colors[x] != BLANK)
+        assert board['rows'][y] == tetris.EMPTYROW | bits
+        assert tetris.isCompleteLine(board, y) == all(color != BLANK for color in colors)
+    blank = sum(column.count(BLANK) for column in listBoard)
+    assert tetris.getBlankSpaces(board) == -blank
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_bitboard_matches_list_board(seed):
+    rng = random.Random(seed)
+    board = tetris.getBlankBoard()
+    listBoard = [[BLANK] * BOARDHEIGHT for _ in range(BOARDWIDTH)]
+    linesRemoved = 0
+
+    for turn in range(300):
+        piece = tetris.getNewPiece(rng)
+        piece['rotation'] = rng.randrange(len(PIECES[piece['shape']]))
+        piece['x'] = rng.randrange(-3, BOARDWIDTH)
+        piece['y'] = rng.randrange(-2, BOARDHEIGHT)
+
+        # Collision checks agree for every move the game checks, including into the
+        # walls and the floor and with boxes above the board. The game never puts a
+        # piece more than one column past a wall, which is as far as the bitboard's
+        # walls reach.
+        for adjX in (-1, 0, 1):
+            for adjY in (0, 1):
+                assert tetris.isValidPosition(board, piece, adjX, adjY) == \
+                    list_is_valid_position(listBoard, piece, adjX, adjY)
+
+        # Drop valid pieces onto both boards.
+        if not tetris.isValidPosition(board, piece) or piece['y'] < 0:
+            continue
+        while tetris.isValidPosition(board, piece, adjY=1):
+            piece['y'] += 1
+        tetris.addToBoard(board, piece)
+        list_add_to_board(listBoard, piece)
+
+        # Fill low rows now and then so that lines, including several at once, clear.
+        if turn % 3 == 0:
+            for y in rng.sample(range(BOARDHEIGHT // 2, BOARDHEIGHT), 2):
+                gap = rng.choice([None, rng.randrange(BOARDWIDTH)])
+                for x in range(BOARDWIDTH):
+                    if x != gap and listBoard[x][y] == BLANK:
+                        board['rows'][y] |= 1 << (x + tetris.WALLWIDTH)
+                        board['colors'][y][x] = 0
+                        listBoard[x][y] = 0
+
+        assert_boards_match(board, listBoard)
+        numLinesRemoved = tetris.removeCompleteLines(board)
+        assert numLinesRemoved == list_remove_complete_lines(listBoard)
+        linesRemoved += numLinesRemoved
+        assert_boards_match(board, listBoard)
+
+        # Start over when the stack gets too high.
+        if any(listBoard[x][4] != BLANK for x in range(BOARDWIDTH)):
+            board = tetris.getBlankBoard()
+            listBoard = [[BLANK] * BOARDHEIGHT for _ in range(BOARDWIDTH)]
+
+    assert linesRemoved > 0
@@ -0,0 +1,100 @@
+"""Checks that TetrisEnv's incremental drawing matches a full redraw of the window."""
+import os
+import random
+import numpy as np
+import pytest
+
+pygame = pytest.importorskip('pygame')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+from pygame.locals import K_DOWN, K_LEFT, K_RIGHT, K_SPACE, K_UNKNOWN, K_UP
+import games.tetris as tetris
+
+
+ACTIONS = [K_UNKNOWN, K_RIGHT, K_LEFT, K_DOWN, K_UP, K_SPACE]
+
+
+def full_redraw(env):
+    """Draws the whole frame the way the game originally did and returns its pixels."""
+    tetris.DISPLAYSURF.fill(tetris.BGCOLOR)
+    tetris.drawBoard(env.board)
+    tetris.drawStatus(env.score, env.level)
+    tetris.drawNextPiece(env.nextPiece)
+    if env.fallingPiece is not None:
+        draw_piece_on_board(env.fallingPiece)
+    return pygame.surfarray.array3d(tetris.DISPLAYSURF)
+
+
+def draw_piece_on_board(piece):
+    """Draws the boxes of a piece that lie within the board's columns."""
+    template = tetris.PIECES[piece['shape']][piece['rotation']]
+    for y in range(tetris.TEMPLATEHEIGHT):
+        for x in range(tetris.TEMPLATEWIDTH):
+            if template[y][x] != tetris.BLANK and 0 <= x + piece['x'] < tetris.BOARDWIDTH:
+                tetris.drawBox(x + piece['x'], y + piece['y'], piece['color'])
+
+
+def fill_random_row(env, rng):
+    """Fills a random low row of the board, entirely or all but one box."""
+    y = rng.randrange(tetris.BOARDHEIGHT // 2, tetris.BOARDHEIGHT)
+    gap = rng.randrange(tetris.BOARDWIDTH) if rng.random() < .5 else None
+    env.board['rows'][y] = tetris.FULLROW
+    env.board['colors'][y] = [rng.randrange(len(tetris.COLORS)) for _ in range(tetris.BOARDWIDTH)]
+    if gap is not None:
+        env.board['rows'][y] &= ~(1 << (gap + tetris.WALLWIDTH))
+        env.board['colors'][y][gap] = tetris.BLANK
+    tetris.removeCompleteLines(env.board)
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_incremental_draw_matches_full_redraw(monkeypatch, seed):
+    tetris.initDisplay()
+    env = tetris.TetrisEnv(seed=seed)
+    updates = []
+    monkeypatch.setattr(pygame.display, 'update', lambda *args: updates.append(args))
+    rng = random.Random(seed)
+    shown = None
+
+    for step in range(600):
+        env.step(rng.choice(ACTIONS))
+        if step % 7 == 0:
+            fill_random_row(env, rng)
+        del updates[:]
+        env.draw()
+        drawn = pygame.surfarray.array3d(tetris.DISPLAYSURF)
+
+        # Only the updated rects of the window change.
+        (args,) = updates
+        if not args:
+            shown = drawn.copy()
+        else:
+            for rect in args[0]:
+                x, y, w, h = pygame.Rect(rect)
+                shown[x:x + w, y:y + h] = drawn[x:x + w, y:y + h]
+
+        expected = full_redraw(env)
+        assert np.array_equal(drawn, expected), 'window differs at step %d' % step
+        assert np.array_equal(shown, expected), 'updates miss changes at step %d' % step
+        pygame.surfarray.blit_array(tetris.DISPLAYSURF, drawn)
+
+
+def test_pieces_above_the_board_against_the_walls(monkeypatch):
+    tetris.initDisplay()
+    env = tetris.TetrisEnv(seed=0)
+    monkeypatch.setattr(pygame.display, 'update', lambda *args: None)
+
+    for shape in sorted(tetris.PIECES):
+        for rotation in range(len(tetris.PIECES[shape])):
+            for adjX in (-1, 1):
+                # push a freshly spawned piece against a wall while it is still above row 0
+                piece = tetris.getNewPiece(random.Random(0))
+                piece.update(shape=shape, rotation=rotation)
+                while tetris.isValidPosition(env.board, piece, adjX=adjX):
+                    piece['x'] += adjX
+                assert piece['y'] < 0
+                env.fallingPiece = piece
+                env.draw()
+                drawn = pygame.surfarray.array3d(tetris.DISPLAYSURF)
+                expected = full_redraw(env)
+                assert np.array_equal(drawn, expected), \
+                    'window differs for %s rotation %d at x=%d' % (shape, rotation, piece['x'])
+                pygame.surfarray.blit_array(tetris.DISPLAYSURF, drawn)
@@ -0,0 +1,82 @@
+"""Checks placement enumeration and afterstates against a search over the game's moves."""
+import copy
+import random
+import numpy as np
+import pytest
+
+pytest.importorskip('pygame')
+import games.tetris as tetris
+from games.tetris import PIECES
+
+
+def reachable_placements(board, piece):
+    """Searches every position the piece can reach at its height by rotating and
+    sliding one step at a time, and drops it straight down from each.
+    """
+    turns = len(PIECES[piece['shape']])
+    start = (piece['rotation'], piece['x'])
+    seen, frontier = {start}, [start]
+    while frontier:
+        rotation, x = frontier.pop()
+        for nextRotation, nextX in [((rotation + 1) % turns, x), ((rotation - 1) % turns, x),
+                                    (rotation, x - 1), (rotation, x + 1)]:
+            moved = dict(piece, rotation=nextRotation, x=nextX)
+            if (nextRotation, nextX) not in seen and tetris.isValidPosition(board, moved):
+                seen.add((nextRotation, nextX))
+                frontier.append((nextRotation, nextX))
+
+    placements = set()
+    for rotation, x in seen:
+        dropped = dict(piece, rotation=rotation, x=x)
+        while tetris.isValidPosition(board, dropped, adjY=1):
+            dropped['y'] += 1
+        placements.add((rotation, x, dropped['y']))
+    return placements
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_placements_and_afterstates(seed):
+    rng = random.Random(seed)
+    env = tetris.TetrisEnv(seed=seed)
+    lineClears = gameOvers = 0
+    for decision in range(300):
+        placements = env.placements()
+        found = [(p['rotation'], p['x'], p['y']) for p in placements]
+        assert len(found) == len(set(found))
+        for placement in placements:
+            assert tetris.isValidPosition(env.board, placement)
+            assert not tetris.isValidPosition(env.board, placement, adjY=1)
+        # Every placement is reachable; while the top of the board is clear, so that
+        # every turn fits where the piece starts, each reachable one is found.
+        expected = reachable_placements(env.board, env.fallingPiece)
+        assert set(found) <= expected
+        if all(row == tetris.EMPTYROW for row in env.board['rows'][:5]):
+            assert set(found) == expected
+
+        # Each afterstate is what placing the piece leaves, without changing the board.
+        rows = env.board['rows'][:]
+        frames, rewards, terminals = env.afterstates(placements)
+        assert env.board['rows'] == rows
+        for index, placement in enumerate(placements):
+            board = copy.deepcopy(env.board)
+            tetris.addToBoard(board, placement)
+            linesRemoved = tetris.removeCompleteLines(board)
+            assert tetris.getAfterstate(env.board, placement) == (board['rows'], linesRemoved)
+            np.testing.assert_array_equal(frames[index], tetris.getBoardImage(board['rows']))
+
+        # Placing the piece gives the afterstate's reward, terminal flag and board. Mostly
+        # taking the best reward, then the lowest placement, makes lines clear.
+        choice = rng.randrange(len(placements))
+        if rng.random() < .8:
+            choice = max(range(len(placements)),
+                         key=lambda index: (rewards[index], placements[index]['y']))
+        frame, reward, terminal = env.place(placements[choice])
+        assert reward == pytest.approx(rewards[choice])
+        assert terminal == terminals[choice]
+        if reward >= 1:
+            lineClears += 1
+        if terminal:
+            gameOvers += 1
+        else:
+            np.testing.assert_array_equal(tetris.getBoardImage(env.board['rows']), frames[choice])
+    assert lineClears > 0 and gameOvers > 0